@@ -7,6 +7,13 @@ interface Question {
   schema?: string;
 }
 
+// Rows of a /view_output page as an aligned text table
+function formatTable(columns: string[], rows: unknown[][]) {
+  const cells = [columns, ...rows.map((row) => row.map((value) => (value === null ? 'NULL' : String(value))))];
+  const widths = columns.map((_, i) => Math.max(...cells.map((row) => row[i].length)));
+  return cells.map((row) => row.map((cell, i) => cell.padEnd(widths[i])).join(' | ')).join('\n');
+}
+
 const questions: Question[] = [
   { 
     id: 1, 
@@ -113,6 +120,9 @@ function App() {
   const [currentQuestionIndex, setCurrentQuestionIndex] = useState(0);
   const [query, setQuery] = useState('');
   const [output, setOutput] = useState('');
+  const [outputRows, setOutputRows] = useState<{ columns: string[]; rows: unknown[][] } | null>(null);
+  // Cursor of the next /view_output page, with the query text it belongs to (the editor may have changed since)
+  const [nextPage, setNextPage] = useState<{ query: string; cursor: string } | null>(null);
   const [submittedQuestions, setSubmittedQuestions] = useState(new Set<number>());
   const [isExecuting, setIsExecuting] = useState(false);
   const [showSchema, setShowSchema] = useState(false);
@@ -213,7 +223,10 @@ function App() {
     }
   };
 
-  const handleViewOutput = async () => {
+  // Without a page the editor's query runs from its first page; with one, that page's query
+  // continues and the rows are appended
+  const handleViewOutput = async (page: { query: string; cursor: string } | null = null) => {
+    const pageQuery = page ? page.query : query;
     setIsExecuting(true);
     try {
       const response = await fetch('http://localhost:5000/view_output', {
@@ -222,13 +235,28 @@ function App() {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
-          query: query,
+          query: pageQuery,
+          cursor: page ? page.cursor : null,
         }),
       });
 
       const data = await response.json();
-      setOutput(data.error ? `Error: ${data.error}` : JSON.stringify(data.results, null, 2));
+      if (!data.columns) {
+        setOutputRows(null);
+        setNextPage(null);
+        setOutput(`Error: ${data.error}`);
+        return;
+      }
+      const shown = {
+        columns: data.columns,
+        rows: page && outputRows ? [...outputRows.rows, ...data.rows] : data.rows,
+      };
+      setOutputRows(shown);
+      setNextPage(data.next_cursor ? { query: pageQuery, cursor: data.next_cursor } : null);
+      // A page can end with an error when a limit is hit while its rows are sent
+      setOutput(formatTable(shown.columns, shown.rows) + (data.error ? `\n\nError: ${data.error}` : ''));
     } catch (error) {
+      setNextPage(null);
       setOutput('Error executing query. Please try again.');
     } finally {
       setIsExecuting(false);
@@ -420,7 +448,7 @@ function App() {
               </button>
 
               <button
-                onClick={handleViewOutput}
+                onClick={() => handleViewOutput()}
                 disabled={isExecuting}
                 className="flex items-center gap-1 px-4 py-2 bg-green-600 text-white rounded-lg hover:bg-green-700 disabled:opacity-50 disabled:cursor-not-allowed"
               >
@@ -459,6 +487,15 @@ function App() {
                 <pre className="bg-gray-50 p-4 rounded-lg overflow-x-auto font-mono text-sm border border-gray-200">
                   {output}
                 </pre>
+                {nextPage && (
+                  <button
+                    onClick={() => handleViewOutput(nextPage)}
+                    disabled={isExecuting}
+                    className="mt-2 px-4 py-2 bg-gray-100 text-gray-700 rounded-lg hover:bg-gray-200 disabled:opacity-50 disabled:cursor-not-allowed"
+                  >
+                    Load more rows
+                  </button>
+                )}
               </div>
             )}
           </div>
@@ -0,0 +1,34 @@
+import os
+import sqlite3
+import sys
+
+# Shared backend helpers live next to the current backend in v3/backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "v3", "backend"))
+from comparator import FINGERPRINT_COLUMNS, build_fingerprint
+
+DB_PATH = "contest_db.sqlite"
+
+# Run every reference query once and store a fingerprint of its result in the
+# `questions` table, so grading in test.py never has to execute it again.
+# Re-run this whenever a question or the data it reads changes.
+conn = sqlite3.connect(DB_PATH)
+cursor = conn.cursor()
+
+# Add the fingerprint columns to databases created before they existed
+existing_columns = {row[1] for row in cursor.execute("PRAGMA table_info(questions)")}
+for name, column_type in FINGERPRINT_COLUMNS.items():
+    if name not in existing_columns:
+        cursor.execute(f"ALTER TABLE questions ADD COLUMN {name} {column_type}")
+
+questions = cursor.execute("SELECT id, correct_query FROM questions").fetchall()
+for question_id, correct_query in questions:
+    fingerprint = build_fingerprint(conn.cursor(), correct_query)
+    record = fingerprint.as_record()
+    assignments = ", ".join(f"{name} = :{name}" for name in record)
+    cursor.execute(f"UPDATE questions SET {assignments} WHERE id = :id", dict(record, id=question_id))
+    print(f"Question {question_id}: {fingerprint.row_count} rows, columns {fingerprint.columns}")
+
+conn.commit()
+conn.close()
+
+print(f"Compiled {len(questions)} questions in '{DB_PATH}'")
@@ -14,11 +14,17 @@ CREATE TABLE IF NOT EXISTS participants (
     score INTEGER NOT NULL
 )
 ''')
+# The expected_* / order_sensitive columns are filled in by compile_questions.py
 cursor.execute('''
 CREATE TABLE IF NOT EXISTS questions (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     question_text TEXT NOT NULL,
-    correct_query TEXT NOT NULL
+    correct_query TEXT NOT NULL,
+    expected_row_count INTEGER,
+    expected_columns TEXT,
+    order_sensitive INTEGER,
+    expected_hash TEXT,
+    expected_size_bytes INTEGER
 )
 ''')
 cursor.execute('''
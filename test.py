@@ -1,14 +1,48 @@
 from flask import Flask, request, jsonify
-import sqlite3
+import os
+import sys
+
+# Shared backend helpers live next to the current backend in v3/backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "v3", "backend"))
+from budget import BudgetExceeded, ExecutionBudget
+from db_pool import ConnectionPool
+from grader import Grader
+from group_commit import GroupCommitWriter
+from migrations import QUERY_CONTEST_MIGRATIONS, run_migrations
+from sandbox import query_executor
+from scoreboard import Scoreboard, mark_finished, store_submissions
+from validator import QueryRejected, validate_query
 
 app = Flask(__name__)
 
 DB_PATH = "contest_db.sqlite"  # Path to your SQLite database
 
+# WAL with synchronous=NORMAL: commits survive a crash of the server (set
+# DB_SYNCHRONOUS=FULL to also survive a power loss)
+db_pool = ConnectionPool(DB_PATH, wal=True, synchronous=os.environ.get("DB_SYNCHRONOUS", "NORMAL"))
+
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # Return results as dictionary
-    return conn
+    return db_pool.connection()  # Rows are returned as sqlite3.Row
+
+# Bring tables and indexes up to date (versioned, safe to run on every start)
+with get_db_connection() as conn:
+    run_migrations(conn, "query_contest", QUERY_CONTEST_MIGRATIONS)
+
+# Time/size limits for contestant queries
+query_budget = ExecutionBudget(timeout=5.0, max_vm_steps=50_000_000, max_rows=10_000)
+
+# Grades contestant queries on a read-only connection; SANDBOX_WORKERS > 0
+# moves them into separate processes with memory/CPU limits
+SANDBOX_WORKERS = int(os.environ.get("SANDBOX_WORKERS", "0"))
+executor = query_executor(Grader(DB_PATH, {}, query_budget), SANDBOX_WORKERS)
+
+# In-memory ranking of the `scoreboard` table, used by /winners
+scoreboard = Scoreboard()
+
+# Submissions are written by one thread, many per transaction (group commit)
+submission_writer = GroupCommitWriter(
+    db_pool.connection, lambda cursor, rows: store_submissions(cursor, rows, score_column="score"))
+MAX_WINNERS = 100
 
 @app.route('/')
 def home():
@@ -27,47 +61,38 @@ def execute_query():
         return jsonify({"error": "Missing required fields: query, user_id, or question_id"})
 
     # Prevent modification queries
-    if any(keyword in user_query.upper() for keyword in ["DROP", "DELETE", "INSERT", "UPDATE"]):
-        return jsonify({"error": "Modifications are not allowed!"})
-
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Fetch the correct query for the given question
-        cursor.execute("SELECT correct_query FROM questions WHERE id = ?", (question_id,))
-        question = cursor.fetchone()
-
-        if not question:
-            conn.close()
-            return jsonify({"error": "Invalid question ID"})
+        validate_query(user_query)
+    except QueryRejected as e:
+        return jsonify({"error": str(e)})
 
-        correct_query = question["correct_query"]
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
 
-        # Execute user's query
-        cursor.execute(user_query)
-        user_result = cursor.fetchall()
+            # Fetch the correct query (and its compiled fingerprint) for the given question
+            cursor.execute("SELECT * FROM questions WHERE id = ?", (question_id,))
+            question = cursor.fetchone()
 
-        # Execute correct query
-        cursor.execute(correct_query)
-        correct_result = cursor.fetchall()
+            if not question:
+                return jsonify({"error": "Invalid question ID"})
 
-        # Compare results and award points
-        score = 1 if user_result == correct_result else 0
+        # Execute user's query and award points. Questions compiled by
+        # compile_questions.py are graded against their stored fingerprint,
+        # others against the result of their correct query
+        score = executor.check(question, user_query)
 
-        # Save submission
-        cursor.execute(
-            "INSERT INTO submissions (user_id, question_id, user_query, score) VALUES (?, ?, ?, ?)",
-            (user_id, question_id, user_query, score)
-        )
-        conn.commit()
-        conn.close()
+        # Save submission; returns once it is committed
+        if not submission_writer.write((user_id, question_id, user_query, score)):
+            return jsonify({"error": "You have already submitted an answer for this question."})
 
         return jsonify({
             "message": "Query submitted successfully!",
             "score_awarded": score
         })
 
+    except BudgetExceeded as e:
+        return jsonify({"error": str(e), "budget_exceeded": e.limit}), 422
     except Exception as e:
         return jsonify({"error": str(e)})
     
@@ -81,41 +106,36 @@ def finalize_score():
         return jsonify({"error": "User ID is required"}), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
 
-        # Check if user already has a final score
-        cursor.execute("SELECT * FROM final_scores WHERE user_id = ?", (user_id,))
-        existing_record = cursor.fetchone()
+            # Check if user already has a final score
+            cursor.execute("SELECT * FROM final_scores WHERE user_id = ?", (user_id,))
+            existing_record = cursor.fetchone()
 
-        if existing_record:
-            conn.close()
-            return jsonify({"error": "Score already finalized for this user"}), 400
+            if existing_record:
+                return jsonify({"error": "Score already finalized for this user"}), 400
 
-        # Calculate total score from submissions
-        cursor.execute("SELECT SUM(score) as total_score FROM submissions WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
-        total_score = result["total_score"] if result["total_score"] is not None else 0
+            # The scoreboard already holds the total, kept current by every submission
+            total_score = mark_finished(cursor, user_id)
 
-        # Store the final score in the final_scores table
-        cursor.execute("INSERT INTO final_scores (user_id, score) VALUES (?, ?)", (user_id, total_score))
-        conn.commit()
-        conn.close()
+            # Store the final score in the final_scores table
+            cursor.execute("INSERT INTO final_scores (user_id, score) VALUES (?, ?)", (user_id, total_score))
+            conn.commit()
 
-        return jsonify({"message": "Final score saved successfully!"})
+        return jsonify({"message": "Final score saved successfully!", "total_score": total_score})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/winners', methods=['GET'])
 def winners():
+    # Top of the live scoreboard (highest score first, ties go to whoever got there first)
+    limit = min(request.args.get('limit', 2, type=int), MAX_WINNERS)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id, score FROM final_scores ORDER BY score DESC LIMIT 2")
-        winner = cursor.fetchall()
-        conn.close()
-        return jsonify({"winners": winner})
+        with get_db_connection() as conn:
+            scoreboard.sync(conn)
+        return jsonify({"winners": scoreboard.top(limit)})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
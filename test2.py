@@ -1,13 +1,28 @@
-from flask import Flask, request, jsonify
-import sqlite3
+from flask import Flask, Response, request, jsonify
+import os
+import sys
+
+# Shared backend helpers live next to the current backend in v3/backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "v3", "backend"))
+from budget import BudgetExceeded, ExecutionBudget
+from db_pool import ConnectionPool
+from grader import Grader
+from migrations import PRACTICE_MIGRATIONS, run_migrations
+from pagination import columnar_json, decode_cursor, encode_cursor, page_size, started
+from result_cache import ResultCache, database_version
+from sandbox import query_executor
+from sql_text import normalize_sql
+from validator import QueryRejected, validate_query
 
 app = Flask(__name__)
 
+DB_PATH = 'contest_db.sqlite'
+
+db_pool = ConnectionPool(DB_PATH, wal=True)
+
 # Database connection function
 def get_db_connection():
-    conn = sqlite3.connect('contest_db.sqlite')
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db_pool.connection()
 
 # Predefined correct answers for each question
 CORRECT_ANSWERS = {
@@ -23,31 +38,21 @@ CORRECT_ANSWERS = {
     10: "SELECT AVG(score) FROM participants;"
 }
 
-# Create tables if not exist
+# Time/size limits for queries run from /view_output
+query_budget = ExecutionBudget(timeout=5.0, max_vm_steps=50_000_000, max_rows=10_000)
+
+# Runs /view_output queries read-only; SANDBOX_WORKERS > 0 moves them into
+# separate processes with memory/CPU limits
+SANDBOX_WORKERS = int(os.environ.get("SANDBOX_WORKERS", "0"))
+executor = query_executor(Grader(DB_PATH, {}, query_budget), SANDBOX_WORKERS)
+
+# Recent /view_output pages, keyed by (database version, normalized query, offset, page size)
+output_cache = ResultCache(max_bytes=64 * 1024 * 1024, ttl=60.0)
+
+# Create tables and indexes if not exist (versioned, safe to run on every start)
 def setup_database():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS submissions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id TEXT NOT NULL,
-        question_id INTEGER NOT NULL,
-        user_query TEXT NOT NULL,
-        is_correct INTEGER NOT NULL DEFAULT 0,
-        UNIQUE(user_id, question_id) -- Prevent multiple submissions per question
-    )
-    ''')
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS scores (
-        user_id TEXT PRIMARY KEY,
-        total_score INTEGER DEFAULT 0
-    )
-    ''')
-
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        run_migrations(conn, "practice", PRACTICE_MIGRATIONS)
 
 setup_database()
 
@@ -59,49 +64,66 @@ def submit_query():
     question_id = data.get('question_id')
     user_query = data.get('query', '')
 
-    if any(word in user_query.upper() for word in ["DROP", "DELETE", "INSERT", "UPDATE"]):
-        return jsonify({"error": "Modifications are not allowed!"})
+    try:
+        validate_query(user_query)
+    except QueryRejected as e:
+        return jsonify({"error": str(e)})
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
 
-        # Check if the user has already submitted for this question
-        cursor.execute("SELECT * FROM submissions WHERE user_id = ? AND question_id = ?", (user_id, question_id))
-        existing_submission = cursor.fetchone()
+            # Check if the user has already submitted for this question
+            cursor.execute("SELECT * FROM submissions WHERE user_id = ? AND question_id = ?", (user_id, question_id))
+            existing_submission = cursor.fetchone()
 
-        if existing_submission:
-            conn.close()
-            return jsonify({"error": "You have already submitted an answer for this question."})
+            if existing_submission:
+                return jsonify({"error": "You have already submitted an answer for this question."})
 
-        # Check correctness
-        is_correct = int(user_query.strip().upper() == CORRECT_ANSWERS[question_id].strip().upper())
+            # Check correctness
+            is_correct = int(user_query.strip().upper() == CORRECT_ANSWERS[question_id].strip().upper())
 
-        # Store submission
-        cursor.execute("INSERT INTO submissions (user_id, question_id, user_query, is_correct) VALUES (?, ?, ?, ?)",
-                       (user_id, question_id, user_query, is_correct))
+            # Store submission
+            cursor.execute("INSERT INTO submissions (user_id, question_id, user_query, is_correct) VALUES (?, ?, ?, ?)",
+                           (user_id, question_id, user_query, is_correct))
 
-        conn.commit()
-        conn.close()
+            conn.commit()
 
         return jsonify({"message": "Answer submitted!", "correct": is_correct})
     except Exception as e:
         return jsonify({"error": str(e)})
 
-# Route to view output of a query
+# Route to view output of a query: one page of it, {"columns": [...], "rows": [[...], ...],
+# "next_cursor": ...}, streamed as it is fetched; send `cursor` for the next page
 @app.route('/view_output', methods=['POST'])
 def view_output():
     data = request.json
     user_query = data.get('query', '')
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(user_query)
-        results = cursor.fetchall()
-        conn.close()
+        validate_query(user_query)
+    except QueryRejected as e:
+        return jsonify({"error": str(e)})
+    try:
+        offset = decode_cursor(user_query, data.get('cursor'))
+        limit = page_size(data.get('limit'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        return jsonify({"results": [dict(row) for row in results]})
+    # Serve repeated pages from memory while the database is unchanged
+    cache_key = (database_version(DB_PATH), normalize_sql(user_query), offset, limit)
+    cached = output_cache.get(cache_key)
+    if cached is not None:
+        return app.response_class(cached, mimetype="application/json")
+
+    try:
+        body = started(columnar_json(
+            executor.stream_page(user_query, offset, limit),
+            next_cursor=lambda: encode_cursor(user_query, offset + limit),
+            on_complete=lambda page: output_cache.put(cache_key, page, len(page))))
+        return Response(body, mimetype="application/json")
+    except BudgetExceeded as e:
+        return jsonify({"error": str(e), "budget_exceeded": e.limit}), 422
     except Exception as e:
         return jsonify({"error": str(e)})
 
@@ -111,19 +133,18 @@ def finish_contest():
     data = request.json
     user_id = data.get('user_id')
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
 
-    # Calculate total score
-    cursor.execute("SELECT SUM(is_correct) FROM submissions WHERE user_id = ?", (user_id,))
-    total_score = cursor.fetchone()[0] or 0
+        # Calculate total score
+        cursor.execute("SELECT SUM(is_correct) FROM submissions WHERE user_id = ?", (user_id,))
+        total_score = cursor.fetchone()[0] or 0
 
-    # Store final score
-    cursor.execute("INSERT INTO scores (user_id, total_score) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET total_score = ?",
-                   (user_id, total_score, total_score))
+        # Store final score
+        cursor.execute("INSERT INTO scores (user_id, total_score) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET total_score = ?",
+                       (user_id, total_score, total_score))
 
-    conn.commit()
-    conn.close()
+        conn.commit()
 
     return jsonify({"message": "Contest completed!", "total_score": total_score})
 
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import time
+
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+from quart import Quart, Response, g, jsonify, request
+
+import metrics
+from budget import BudgetExceeded
+from db_executor import MAX_THREADS, PER_DATABASE, DatabaseExecutor
+from pagination import columnar_json, decode_cursor, encode_cursor, page_size
+from result_cache import database_version
+from sql_text import normalize_sql
+from test3 import (DEFAULT_CONTEST, MAX_WINNERS, already_submitted, contestant_query, contests, finalize,
+                   grade, graded_before, output_cache, shutdown, top_scores, warm_up)
+from validator import QueryRejected, validate_query
+
+# asyncio version of the contest API (test3.py) for many mostly idle clients: a
+# request waiting on SQLite, a group commit or a slow client holds a coroutine
+# instead of a thread. Contests, caches and settings are test3's. Run from this
+# directory with `python async_app.py` (or `hypercorn async_app:app`).
+
+app = Quart(__name__)
+
+BIND = os.environ.get("BIND", "0.0.0.0:5000")
+
+# SQLite calls run on SQLITE_THREADS threads, at most SQLITE_CALLS_PER_DB at once per database file
+sqlite = DatabaseExecutor(max_threads=int(os.environ.get("SQLITE_THREADS", MAX_THREADS)),
+                          per_database=int(os.environ.get("SQLITE_CALLS_PER_DB", PER_DATABASE)))
+
+def on_admin_db(contest, function, *args):
+    return sqlite.run(contest.admin_db_path, function, *args)
+
+def on_dataset(contest, function, *args):
+    return sqlite.run(contest.dataset_path, function, *args)
+
+def requested_contest(params):
+    return contests.get(params.get('contest_id', DEFAULT_CONTEST))
+
+def unknown_contest():
+    return jsonify({"error": "Unknown contest"}), 404
+
+def page_body(contest, user_query, offset, limit, cache_key):
+    # The whole page (at most pagination.MAX_PAGE_ROWS rows), so the connection and
+    # thread are free again before it is sent to the client
+    with contests.dataset(contest.contest_id) as dataset, contestant_query("view", contest, user_query):
+        chunks = columnar_json(dataset.stream_page(user_query, offset, limit),
+                               next_cursor=lambda: encode_cursor(user_query, offset + limit),
+                               on_complete=lambda page: output_cache.put(cache_key, page, len(page)))
+        return "".join(chunks).encode()
+
+@app.before_serving
+async def open_contests():
+    await asyncio.get_running_loop().run_in_executor(None, warm_up)
+
+@app.after_serving
+async def close_contests():
+    # Write the pending submissions and verdicts once the last SQLite call has returned
+    sqlite.shutdown()
+    await asyncio.get_running_loop().run_in_executor(None, shutdown)
+
+@app.before_request
+async def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+async def record_request_time(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.REGISTRY.observe("request_seconds", time.perf_counter() - g.request_start,
+                             endpoint=endpoint, status=response.status_code)
+    return response
+
+@app.route('/submit_query', methods=['POST'])
+async def submit_query():
+    data = await request.get_json()
+    user_id = data.get('user_id')
+    question_id = data.get('question_id')
+    user_query = data.get('query', '')
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+    contest = requested_contest(data)
+    if contest is None:
+        return unknown_contest()
+
+    try:
+        with metrics.stage("validate"):
+            validate_query(user_query)
+    except QueryRejected as e:
+        return jsonify({"error": str(e)})
+
+    try:
+        admin = await on_admin_db(contest, contests.admin, contest.contest_id)
+
+        if await on_admin_db(contest, already_submitted, admin, user_id, question_id):
+            return jsonify({"error": "You have already submitted an answer for this question."})
+        if question_id not in contest.answers:
+            return jsonify({"error": "Correct query not defined for this question."})
+
+        is_correct = await on_admin_db(contest, graded_before, admin, question_id, user_query)
+
+        if is_correct is None and admin.grading_queue is not None:
+            with metrics.stage("enqueue"):
+                submission_id = await on_admin_db(contest, admin.grading_queue.enqueue,
+                                                  user_id, question_id, user_query)
+            if submission_id is None:
+                return jsonify({"error": "You have already submitted an answer for this question."})
+            return jsonify({"message": "Answer queued for grading", "submission_id": submission_id,
+                            "status": "queued"}), 202
+
+        if is_correct is None:
+            is_correct = await on_dataset(contest, grade, contest, admin, question_id, user_query)
+
+        # The group-commit writer resolves the future; no thread waits for the commit
+        with metrics.stage("store"):
+            stored, = await asyncio.wrap_future(admin.writer.submit([(user_id, question_id, user_query, is_correct)]))
+        if not stored:
+            return jsonify({"error": "You have already submitted an answer for this question."})
+
+        return jsonify({"message": "Answer submitted!", "correct": is_correct})
+
+    except BudgetExceeded as e:
+        return jsonify({"error": str(e), "budget_exceeded": e.limit}), 422
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
+@app.route('/view_output', methods=['POST'])
+async def view_output():
+    data = await request.get_json()
+    user_query = data.get('query', '')
+    contest = requested_contest(data)
+    if contest is None:
+        return unknown_contest()
+
+    try:
+        with metrics.stage("validate"):
+            validate_query(user_query)
+    except QueryRejected as e:
+        return jsonify({"error": str(e)})
+    try:
+        offset = decode_cursor(user_query, data.get('cursor'))
+        limit = page_size(data.get('limit'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cache_key = (contest.contest_id, database_version(contest.dataset_path), normalize_sql(user_query),
+                 offset, limit)
+    body = output_cache.get(cache_key)
+    try:
+        if body is None:
+            body = await on_dataset(contest, page_body, contest, user_query, offset, limit, cache_key)
+        return Response(body, mimetype="application/json")
+    except BudgetExceeded as e:
+        return jsonify({"error": str(e), "budget_exceeded": e.limit}), 422
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
+@app.route('/finish', methods=['POST'])
+async def finalize_score():
+    data = await request.get_json()
+    user_id = data.get('user_id')
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+    contest = requested_contest(data)
+    if contest is None:
+        return unknown_contest()
+
+    try:
+        admin = await on_admin_db(contest, contests.admin, contest.contest_id)
+        total_score = await on_admin_db(contest, finalize, admin, user_id)
+        if total_score is None:
+            return jsonify({"error": "Score already finalized for this user"}), 400
+
+        return jsonify({"message": "Final score saved successfully!", "total_score": total_score})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/winners', methods=['GET'])
+async def winners():
+    limit = min(request.args.get('limit', 2, type=int), MAX_WINNERS)
+    contest = requested_contest(request.args)
+    if contest is None:
+        return unknown_contest()
+    try:
+        admin = await on_admin_db(contest, contests.admin, contest.contest_id)
+        return jsonify({"winners": await on_admin_db(contest, top_scores, admin, limit)})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+if __name__ == '__main__':
+    config = Config()
+    config.bind = [BIND]
+    asyncio.run(serve(app, config))
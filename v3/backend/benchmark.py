@@ -0,0 +1,435 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from comparator import build_fingerprint, build_reference, cursor_matches, fingerprint_matches
+
+# Load test for the test3.py endpoints.
+#
+#   python benchmark.py                         # 1x/10x/100x datasets, in-process test client
+#   python benchmark.py --scales 1 --contestants 50 --concurrency 8
+#   python benchmark.py --url http://localhost:5000   # replay against a running server
+#   python benchmark.py --generate datasets/    # only write bookstore_<N>x.db files
+#   python benchmark.py --json results.json     # keep numbers to compare runs
+#
+# Each scale runs in a fresh process on a generated bookstore.db, so the peak
+# RSS column is the peak of that scale's whole run (server and client share
+# the process). Runs are reproducible for a given --seed.
+
+# Rows per table at scale 1x
+BASE_ROWS = {"authors": 50, "books": 200, "customers": 100, "orders": 500}
+
+GENRES = ["Fantasy", "Science Fiction", "Mystery", "Romance", "History", "Biography", "Poetry", "Horror"]
+COUNTRIES = ["United Kingdom", "United States", "France", "Germany", "India", "Japan", "Nigeria", "Brazil"]
+
+# Answers that grade as correct (different spellings, so the validator and
+# caches see more than one text per question)
+CORRECT_QUERIES = {
+    1: ["SELECT * FROM books WHERE price > 20;", "select * from books where 20 < price"],
+    2: ["SELECT COUNT(*) FROM customers;", "SELECT COUNT(*) FROM customers WHERE 1"],
+    3: ["SELECT name FROM authors WHERE country = 'United Kingdom';",
+        "SELECT a.name FROM authors a WHERE a.country = 'United Kingdom'"],
+    4: ["SELECT title FROM books WHERE genre = 'Fantasy';", "select title from books where genre='Fantasy'"],
+    5: ["SELECT SUM(total_price) FROM orders;"],
+    6: ["SELECT title FROM books ORDER BY price DESC LIMIT 1;"],
+    7: ["SELECT AVG(price) FROM books;"],
+    8: ["SELECT name FROM customers WHERE customer_id IN (SELECT customer_id FROM orders);"],
+    9: ["SELECT title FROM books WHERE stock < 50;", "SELECT title FROM books WHERE NOT stock >= 50"],
+    10: ["SELECT COUNT(DISTINCT genre) FROM books;"],
+}
+
+WRONG_QUERIES = {
+    1: ["SELECT * FROM books WHERE price >= 20", "SELECT title FROM books WHERE price > 20"],
+    2: ["SELECT COUNT(*) FROM orders", "SELECT * FROM customers"],
+    3: ["SELECT name FROM authors", "SELECT name FROM authors WHERE country = 'United States'"],
+    4: ["SELECT title FROM books WHERE genre = 'Horror'"],
+    5: ["SELECT SUM(quantity) FROM orders", "SELECT total_price FROM orders"],
+    6: ["SELECT title FROM books ORDER BY price LIMIT 1"],
+    7: ["SELECT AVG(stock) FROM books"],
+    8: ["SELECT name FROM customers"],
+    9: ["SELECT title FROM books WHERE stock <= 50"],
+    10: ["SELECT COUNT(genre) FROM books"],
+}
+
+# Queries that hit a budget limit or are rejected
+PATHOLOGICAL_QUERIES = [
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT COUNT(*) FROM c",
+    "SELECT * FROM orders a, orders b",
+    "SELECT COUNT(*) FROM orders a, orders b, books c",
+    "SELECT group_concat(a.title || b.title) FROM books a, books b",
+    "DELETE FROM books",
+    "SELECT * FROM books; DROP TABLE books",
+]
+
+VIEW_QUERIES = [
+    "SELECT * FROM books LIMIT 20",
+    "SELECT genre, COUNT(*) AS books FROM books GROUP BY genre",
+    "SELECT * FROM orders ORDER BY total_price DESC LIMIT 50",
+    "SELECT c.name, SUM(o.total_price) AS spent FROM customers c JOIN orders o USING (customer_id) GROUP BY c.name",
+]
+
+
+def generate_bookstore(path, scale, seed=0):
+    """Write a synthetic bookstore database with BASE_ROWS * `scale` rows per table."""
+    rng = random.Random(seed)
+    counts = {table: rows * scale for table, rows in BASE_ROWS.items()}
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+    CREATE TABLE authors (author_id INTEGER PRIMARY KEY, name TEXT, country TEXT);
+    CREATE TABLE books (id INTEGER PRIMARY KEY, title TEXT, author_id INTEGER, genre TEXT, price REAL, stock INTEGER);
+    CREATE TABLE customers (customer_id INTEGER PRIMARY KEY, name TEXT, email TEXT);
+    CREATE TABLE orders (order_id INTEGER PRIMARY KEY, customer_id INTEGER, book_id INTEGER,
+                         quantity INTEGER, total_price REAL);
+    ''')
+    conn.executemany("INSERT INTO authors VALUES (?, ?, ?)", [
+        (i, f"Author {i}", rng.choice(COUNTRIES)) for i in range(1, counts["authors"] + 1)])
+    prices = {}
+    books = []
+    for i in range(1, counts["books"] + 1):
+        prices[i] = round(rng.uniform(5, 60), 2)
+        books.append([i, f"Book {i}", rng.randint(1, counts["authors"]), rng.choice(GENRES),
+                      prices[i], rng.randint(0, 200)])
+    # Rows on the boundaries of questions 1 and 9, so that their off-by-one
+    # WRONG_QUERIES (price >= 20, stock <= 50) really return something else
+    prices[1] = books[0][4] = 20.0
+    books[1][5] = 50
+    conn.executemany("INSERT INTO books VALUES (?, ?, ?, ?, ?, ?)", books)
+    conn.executemany("INSERT INTO customers VALUES (?, ?, ?)", [
+        (i, f"Customer {i}", f"customer{i}@example.com") for i in range(1, counts["customers"] + 1)])
+    orders = []
+    for i in range(1, counts["orders"] + 1):
+        book_id = rng.randint(1, counts["books"])
+        quantity = rng.randint(1, 5)
+        # Only ~70% of customers ever order, so question 8 isn't trivial
+        customer_id = rng.randint(1, max(1, counts["customers"] * 7 // 10))
+        orders.append((i, customer_id, book_id, quantity, round(prices[book_id] * quantity, 2)))
+    conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?)", orders)
+    conn.commit()
+    conn.close()
+    return counts
+
+
+def contestant_traffic(contestants, seed=0, wrong_share=0.3, pathological_share=0.05):
+    """Request sequences, one list per contestant: (endpoint, method, path, body, expected).
+
+    Each contestant looks at some output, answers every question once
+    (correct, wrong or pathological), then finishes and checks the winners.
+    `expected` is what the response should be: "ok", "correct" or "wrong"
+    (graded 1 or 0), or "any" for pathological queries, which may be
+    refused.
+    """
+    rng = random.Random(seed)
+    traffic = []
+    for number in range(contestants):
+        user_id = f"bench-{seed}-{number}"
+        requests = []
+        questions = list(CORRECT_QUERIES)
+        rng.shuffle(questions)
+        for question_id in questions:
+            roll = rng.random()
+            if roll < pathological_share:
+                query, expected = rng.choice(PATHOLOGICAL_QUERIES), "any"
+            elif roll < pathological_share + wrong_share:
+                query, expected = rng.choice(WRONG_QUERIES[question_id]), "wrong"
+            else:
+                query, expected = rng.choice(CORRECT_QUERIES[question_id]), "correct"
+            for _ in range(rng.randint(0, 2)):
+                if rng.random() < 0.5:
+                    view, view_expected = query, "any" if expected == "any" else "ok"
+                else:
+                    view, view_expected = rng.choice(VIEW_QUERIES), "ok"
+                requests.append(("/view_output", "POST", "/view_output", {"query": view}, view_expected))
+            requests.append(("/submit_query", "POST", "/submit_query",
+                             {"user_id": user_id, "question_id": question_id, "query": query}, expected))
+        requests.append(("/finish", "POST", "/finish", {"user_id": user_id}, "ok"))
+        requests.append(("/winners", "GET", "/winners?limit=10", None, "ok"))
+        traffic.append(requests)
+    return traffic
+
+
+def check_response(expected, status, body):
+    """"error" or "misgraded" if a response isn't what the request should get, else None.
+
+    The app reports most failures as 200 {"error": ...} or a 4xx, so both count.
+    """
+    if status is None or status >= 500:
+        return "error"
+    if expected == "any":
+        return None
+    if status >= 400 or not isinstance(body, dict) or "error" in body:
+        return "error"
+    if expected in ("correct", "wrong") and body.get("correct") != (1 if expected == "correct" else 0):
+        return "misgraded"
+    return None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its finished children, in MB."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024  # bytes on macOS, KB on Linux
+    return round(max(own, children) / divisor, 1)
+
+
+class LocalClient:
+    """Sends requests to the Flask app in this process."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """Sends requests to a running server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, self._json(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, self._json(e.read())
+
+    @staticmethod
+    def _json(data):
+        try:
+            return json.loads(data)
+        except ValueError:
+            return None
+
+
+def replay(client, traffic, concurrency):
+    """Run every contestant's requests in order, `concurrency` contestants at a time.
+
+    Returns ({endpoint: [latency seconds]}, {(endpoint, "error" or "misgraded"): count},
+    wall seconds); see check_response().
+    """
+    latencies = {}
+    errors = {}
+    lock = threading.Lock()
+    pending = list(reversed(traffic))
+
+    def run():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                requests = pending.pop()
+            for endpoint, method, path, body, expected in requests:
+                start = time.perf_counter()
+                try:
+                    status, response = client.request(method, path, body)
+                except Exception:
+                    status, response = None, None
+                elapsed = time.perf_counter() - start
+                problem = check_response(expected, status, response)
+                with lock:
+                    latencies.setdefault(endpoint, []).append(elapsed)
+                    if problem is not None:
+                        errors[endpoint, problem] = errors.get((endpoint, problem), 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=run) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def summarize(latencies, errors, wall, rss_mb=None):
+    rows = []
+    for endpoint in sorted(latencies):
+        values = sorted(latencies[endpoint])
+        rows.append({
+            "endpoint": endpoint,
+            "requests": len(values),
+            "errors": errors.get((endpoint, "error"), 0),
+            "misgraded": errors.get((endpoint, "misgraded"), 0),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            "throughput_rps": round(len(values) / wall, 1) if wall else None,
+            "peak_rss_mb": rss_mb,
+        })
+    return rows
+
+
+def time_call(function, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_comparison(db_path, repeat=3):
+    """Time the result comparison on the largest table (best of `repeat`)."""
+    conn = sqlite3.connect(db_path)
+    reference_query = "SELECT * FROM orders"
+    reference = build_reference(conn.cursor(), reference_query)
+    fingerprint = build_fingerprint(conn.cursor(), reference_query)
+    cases = {
+        "identical": "SELECT * FROM orders",
+        "columns reordered": "SELECT total_price, quantity, book_id, customer_id, order_id FROM orders",
+        "rows shuffled": "SELECT * FROM orders ORDER BY random()",
+        "one row wrong": "SELECT order_id, customer_id, book_id, quantity, "
+                         "CASE WHEN order_id = (SELECT MAX(order_id) FROM orders) THEN 0 ELSE total_price END "
+                         "AS total_price FROM orders",
+    }
+    results = []
+    for name, query in cases.items():
+        def run_reference():
+            return cursor_matches(reference, conn.execute(query))
+
+        def run_fingerprint():
+            return fingerprint_matches(fingerprint, conn.execute(query))
+
+        for method, function in (("multiset", run_reference), ("fingerprint", run_fingerprint)):
+            seconds, matched = time_call(function, repeat)
+            results.append({
+                "case": name,
+                "method": method,
+                "rows": reference.row_count,
+                "matched": matched,
+                "ms": round(seconds * 1000, 2),
+                "rows_per_s": round(reference.row_count / seconds) if seconds else None,
+            })
+    conn.close()
+    return results
+
+
+def run_scale(scale, options):
+    """Benchmark test3.py on a fresh bookstore dataset at `scale` (run in its own process)."""
+    workdir = tempfile.mkdtemp(prefix=f"bench-{scale}x-")
+    try:
+        counts = generate_bookstore(os.path.join(workdir, "bookstore.db"), scale, options["seed"])
+        # test3.py opens bookstore.db and contest.db relative to the working directory
+        os.chdir(workdir)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import test3
+
+        traffic = contestant_traffic(options["contestants"], options["seed"],
+                                     options["wrong_share"], options["pathological_share"])
+        latencies, errors, wall = replay(LocalClient(test3.app), traffic, options["concurrency"])
+        return {
+            "scale": scale,
+            "rows": counts,
+            "wall_s": round(wall, 2),
+            "endpoints": summarize(latencies, errors, wall, peak_rss_mb()),
+            "comparison": bench_comparison("bookstore.db"),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run_scale_process(scale, options, results):
+    results.put(run_scale(scale, options))
+
+
+def print_report(result):
+    title = f"scale {result['scale']}x" if "scale" in result else result.get("target", "")
+    print(f"\n== {title} ({result['wall_s']}s) ==")
+    if "rows" in result:
+        print("rows: " + ", ".join(f"{table} {count}" for table, count in result["rows"].items()))
+    print(f"{'endpoint':<15}{'requests':>9}{'errors':>8}{'misgraded':>11}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'req/s':>9}{'peak RSS MB':>13}")
+    for row in result["endpoints"]:
+        rss = row["peak_rss_mb"] if row["peak_rss_mb"] is not None else "-"
+        print(f"{row['endpoint']:<15}{row['requests']:>9}{row['errors']:>8}{row['misgraded']:>11}{row['p50_ms']:>10}"
+              f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row['throughput_rps']:>9}{rss:>13}")
+    if result.get("comparison"):
+        print(f"{'comparison':<22}{'method':<13}{'rows':>8}{'match':>7}{'ms':>10}{'rows/s':>12}")
+        for row in result["comparison"]:
+            print(f"{row['case']:<22}{row['method']:<13}{row['rows']:>8}{str(row['matched']):>7}"
+                  f"{row['ms']:>10}{row['rows_per_s']:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the contest grading endpoints.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--contestants", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--wrong-share", type=float, default=0.3)
+    parser.add_argument("--pathological-share", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="replay against a running server instead of the test client")
+    parser.add_argument("--generate", metavar="DIR", help="only write the datasets into DIR")
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    if args.generate:
+        os.makedirs(args.generate, exist_ok=True)
+        for scale in args.scales:
+            path = os.path.join(args.generate, f"bookstore_{scale}x.db")
+            counts = generate_bookstore(path, scale, args.seed)
+            print(f"{path}: " + ", ".join(f"{table} {count}" for table, count in counts.items()))
+        return
+
+    options = {
+        "contestants": args.contestants,
+        "concurrency": args.concurrency,
+        "wrong_share": args.wrong_share,
+        "pathological_share": args.pathological_share,
+        "seed": args.seed,
+    }
+    results = []
+    if args.url:
+        traffic = contestant_traffic(args.contestants, args.seed, args.wrong_share, args.pathological_share)
+        latencies, errors, wall = replay(HttpClient(args.url), traffic, args.concurrency)
+        results.append({"target": args.url, "wall_s": round(wall, 2),
+                        "endpoints": summarize(latencies, errors, wall)})
+        print_report(results[-1])
+    else:
+        # Not a Pool: its daemon workers couldn't start test3's sandbox/grader processes
+        context = multiprocessing.get_context("spawn")
+        for scale in args.scales:
+            queue = context.Queue()
+            process = context.Process(target=_run_scale_process, args=(scale, options, queue))
+            process.start()
+            results.append(queue.get())
+            process.join()
+            print_report(results[-1])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+
+# Default limits for one contestant query
+QUERY_TIMEOUT_SECONDS = 5.0
+MAX_VM_STEPS = 50_000_000
+MAX_RESULT_ROWS = 10_000
+MAX_RESULT_BYTES = 8 * 1024 * 1024
+# Queries whose plan is estimated to read more rows than this are refused
+# before they run (see query_plan.py); None turns the check off
+MAX_PLAN_COST = 100_000_000
+
+# SQLite calls the progress handler once every this many VM instructions
+PROGRESS_INTERVAL = 10_000
+
+
+class BudgetExceeded(Exception):
+    """A query ran past one of the limits of its ExecutionBudget."""
+
+    def __init__(self, limit, message):
+        super().__init__(message)
+        self.limit = limit  # "timeout", "vm_steps", "rows", "bytes", "cost" (or "cpu"/"memory" from sandbox.py)
+
+
+def row_size(row):
+    """Rough number of bytes a result row takes once serialized."""
+    size = 0
+    for value in row:
+        if isinstance(value, (str, bytes)):
+            size += len(value)
+        elif value is not None:
+            size += 8
+    return size
+
+
+class BudgetTracker:
+    """Usage of one query against its budget (created by ExecutionBudget.run)."""
+
+    def __init__(self, budget, max_rows=None, max_bytes=None):
+        self.budget = budget
+        self.max_rows = budget.max_rows if max_rows is None else max_rows
+        self.max_bytes = budget.max_bytes if max_bytes is None else max_bytes
+        self.deadline = time.monotonic() + budget.timeout
+        self.steps = 0
+        self.rows = 0
+        self.bytes = 0
+        self.exceeded = None
+
+    def _fail(self, limit, message):
+        self.exceeded = BudgetExceeded(limit, message)
+        raise self.exceeded
+
+    def _progress(self):
+        # Returning non-zero makes SQLite abort the statement with "interrupted"
+        self.steps += self.budget.progress_interval
+        if self.steps > self.budget.max_vm_steps:
+            self.exceeded = BudgetExceeded("vm_steps", "Query exceeded the execution step limit")
+            return 1
+        if time.monotonic() > self.deadline:
+            self.exceeded = BudgetExceeded("timeout", f"Query exceeded the {self.budget.timeout:g}s time limit")
+            return 1
+        return 0
+
+    def charge(self, row):
+        self.rows += 1
+        self.bytes += row_size(row)
+        if self.rows > self.max_rows:
+            self._fail("rows", f"Query returned more than {self.max_rows} rows")
+        if self.bytes > self.max_bytes:
+            self._fail("bytes", f"Query returned more than {self.max_bytes} bytes")
+        if time.monotonic() > self.deadline:
+            self._fail("timeout", f"Query exceeded the {self.budget.timeout:g}s time limit")
+
+    def track(self, rows):
+        """Pass rows through while charging each one against the budget."""
+        for row in rows:
+            self.charge(row)
+            yield row
+
+
+class ExecutionBudget:
+    """Time, VM-step, row and byte limits for running untrusted SQL.
+
+        with query_budget.run(conn) as tracker:
+            cursor.execute(user_query)
+            rows = list(tracker.track(iter_rows(cursor)))
+
+    Any limit that is hit surfaces as BudgetExceeded from the `with` block.
+    run(conn, max_rows=..., max_bytes=...) replaces the row and byte limits
+    for one query, e.g. to let a graded answer return as much as its reference.
+    """
+
+    def __init__(self, timeout=QUERY_TIMEOUT_SECONDS, max_vm_steps=MAX_VM_STEPS,
+                 max_rows=MAX_RESULT_ROWS, max_bytes=MAX_RESULT_BYTES,
+                 progress_interval=PROGRESS_INTERVAL, max_plan_cost=MAX_PLAN_COST):
+        self.timeout = timeout
+        self.max_vm_steps = max_vm_steps
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.progress_interval = progress_interval
+        self.max_plan_cost = max_plan_cost
+
+    @contextmanager
+    def run(self, conn, max_rows=None, max_bytes=None):
+        tracker = BudgetTracker(self, max_rows, max_bytes)
+        conn.set_progress_handler(tracker._progress, self.progress_interval)
+        try:
+            yield tracker
+        except sqlite3.OperationalError:
+            if tracker.exceeded is not None:
+                raise tracker.exceeded from None
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
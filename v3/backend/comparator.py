@@ -0,0 +1,248 @@
+import hashlib
+import json
+from collections import Counter
+
+from budget import row_size
+from sql_text import has_top_level_order_by
+
+# Floats are compared after rounding so AVG/SUM results don't depend on
+# the order SQLite happened to add the values in.
+FLOAT_DIGITS = 6
+
+# User results are pulled from the cursor this many rows at a time
+FETCH_BATCH_SIZE = 500
+
+
+def normalize_value(value):
+    if isinstance(value, float):
+        return round(value, FLOAT_DIGITS)
+    return value
+
+
+def normalize_row(row):
+    return tuple(normalize_value(value) for value in row)
+
+
+def column_names(cursor):
+    if cursor.description is None:
+        return []
+    return [column[0] for column in cursor.description]
+
+
+def iter_rows(cursor, batch_size=FETCH_BATCH_SIZE):
+    """Yield a cursor's rows using fetchmany, so nothing is fetched ahead of the comparison."""
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield from batch
+
+
+class ReferenceResult:
+    """Normalized result of a reference query, ready to be compared against.
+
+    Unordered references keep a multiset (row tuple -> count); references
+    whose query has a top-level ORDER BY keep the rows in order.
+    """
+
+    def __init__(self, columns, rows, ordered):
+        self.columns = columns
+        self.ordered = ordered
+        self.row_count = len(rows)
+        self.size_bytes = sum(row_size(row) for row in rows)
+        self.rows = list(rows) if ordered else Counter(rows)
+
+    @property
+    def mode(self):
+        return "ordered" if self.ordered else "multiset"
+
+
+def build_reference(cursor, query):
+    """Run a reference query and return its ReferenceResult."""
+    cursor.execute(query)
+    columns = column_names(cursor)
+    rows = [normalize_row(row) for row in cursor]
+    return ReferenceResult(columns, rows, has_top_level_order_by(query))
+
+
+def column_order(reference_columns, columns):
+    """Positions that reorder `columns` into the reference order, or None.
+
+    Columns are matched by name, so `SELECT b, a` answers `SELECT a, b`.
+    """
+    if columns == reference_columns:
+        return None
+    if sorted(columns) != sorted(reference_columns):
+        raise ValueError("column mismatch")
+    positions = {}
+    for index, name in enumerate(columns):
+        positions.setdefault(name, []).append(index)
+    return [positions[name].pop(0) for name in reference_columns]
+
+
+class Comparator:
+    """Decides whether a stream of normalized user rows matches a ReferenceResult.
+
+    `rows` is consumed lazily and the comparison stops at the first row that
+    proves the answer wrong, so at most `reference.row_count + 1` rows are read.
+    """
+
+    def matches(self, reference, rows):
+        raise NotImplementedError
+
+
+class MultisetComparator(Comparator):
+    """Row order is ignored; every row has to appear as often as in the reference."""
+
+    def matches(self, reference, rows):
+        remaining = reference.rows.copy()
+        seen = 0
+        for row in rows:
+            seen += 1
+            count = remaining.get(row, 0)
+            if seen > reference.row_count or not count:
+                return False
+            remaining[row] = count - 1
+        return seen == reference.row_count
+
+
+class OrderedComparator(Comparator):
+    """Rows have to come back in exactly the reference order."""
+
+    def matches(self, reference, rows):
+        seen = 0
+        for row in rows:
+            if seen >= reference.row_count or row != reference.rows[seen]:
+                return False
+            seen += 1
+        return seen == reference.row_count
+
+
+COMPARATORS = {
+    "multiset": MultisetComparator(),
+    "ordered": OrderedComparator(),
+}
+
+
+def results_match(reference, columns, rows):
+    """Compare raw user rows (any iterable of tuples/Rows) with a reference."""
+    if hasattr(rows, "__len__") and len(rows) != reference.row_count:
+        return False
+    try:
+        order = column_order(reference.columns, columns)
+    except ValueError:
+        return False
+    return COMPARATORS[reference.mode].matches(reference, reorder_rows(order, rows))
+
+
+def reorder_rows(order, rows):
+    """Normalize rows, moving their values into the order given by column_order()."""
+    if order is None:
+        return (normalize_row(row) for row in rows)
+    return (normalize_row([row[i] for i in order]) for row in rows)
+
+
+def cursor_matches(reference, cursor, tracker=None, batch_size=FETCH_BATCH_SIZE):
+    """Grade an executed user cursor without materializing its whole result.
+
+    If a budget `tracker` is given every fetched row is charged against it.
+    """
+    rows = iter_rows(cursor, batch_size)
+    if tracker is not None:
+        rows = tracker.track(rows)
+    return results_match(reference, column_names(cursor), rows)
+
+
+# Columns of the `questions` table that hold a compiled Fingerprint
+FINGERPRINT_COLUMNS = {
+    "expected_row_count": "INTEGER",
+    "expected_columns": "TEXT",
+    "order_sensitive": "INTEGER",
+    "expected_hash": "TEXT",
+    "expected_size_bytes": "INTEGER",
+}
+
+_HASH_BITS = 128
+
+
+def row_digest(row):
+    """Stable 128-bit hash of a normalized row (3 and 3.0 hash the same)."""
+    canonical = tuple(int(v) if isinstance(v, float) and v.is_integer() else v for v in row)
+    return hashlib.blake2b(repr(canonical).encode(), digest_size=_HASH_BITS // 8).digest()
+
+
+def hash_rows(rows, ordered, limit=None):
+    """Return (row count, hex digest, size in bytes) of normalized rows.
+
+    Unordered results use the sum of the row hashes, which doesn't depend on
+    row order; ordered results chain the row hashes. Stops reading (and
+    returns a None digest) once more than `limit` rows have been seen.
+    """
+    count = 0
+    size = 0
+    chained = hashlib.blake2b(digest_size=_HASH_BITS // 8)
+    total = 0
+    for row in rows:
+        count += 1
+        if limit is not None and count > limit:
+            return count, None, size
+        size += row_size(row)
+        digest = row_digest(row)
+        if ordered:
+            chained.update(digest)
+        else:
+            total = (total + int.from_bytes(digest, "big")) % (1 << _HASH_BITS)
+    if ordered:
+        return count, chained.hexdigest(), size
+    return count, format(total, "032x"), size
+
+
+class Fingerprint:
+    """Compact summary of a reference result, small enough to store with the question."""
+
+    def __init__(self, columns, row_count, ordered, digest, size_bytes=None):
+        self.columns = columns
+        self.row_count = row_count
+        self.ordered = ordered
+        self.digest = digest
+        self.size_bytes = size_bytes  # None if compiled before it was recorded
+
+    def as_record(self):
+        return {
+            "expected_row_count": self.row_count,
+            "expected_columns": json.dumps(self.columns),
+            "order_sensitive": int(self.ordered),
+            "expected_hash": self.digest,
+            "expected_size_bytes": self.size_bytes,
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        """Read a Fingerprint from a `questions` row, or None if it wasn't compiled."""
+        if "expected_hash" not in record.keys() or record["expected_hash"] is None:
+            return None
+        size_bytes = record["expected_size_bytes"] if "expected_size_bytes" in record.keys() else None
+        return cls(json.loads(record["expected_columns"]), record["expected_row_count"],
+                   bool(record["order_sensitive"]), record["expected_hash"], size_bytes)
+
+
+def build_fingerprint(cursor, query):
+    """Run a reference query and return its Fingerprint."""
+    cursor.execute(query)
+    ordered = has_top_level_order_by(query)
+    row_count, digest, size_bytes = hash_rows(reorder_rows(None, iter_rows(cursor)), ordered)
+    return Fingerprint(column_names(cursor), row_count, ordered, digest, size_bytes)
+
+
+def fingerprint_matches(fingerprint, cursor, tracker=None):
+    """Grade an executed user cursor against a stored Fingerprint."""
+    try:
+        order = column_order(fingerprint.columns, column_names(cursor))
+    except ValueError:
+        return False
+    rows = iter_rows(cursor)
+    if tracker is not None:
+        rows = tracker.track(rows)
+    row_count, digest, _ = hash_rows(reorder_rows(order, rows), fingerprint.ordered,
+                                     limit=fingerprint.row_count)
+    return row_count == fingerprint.row_count and digest == fingerprint.digest
@@ -0,0 +1,184 @@
+import json
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+# Memory the loaded contest datasets (in-memory copies and reference results) may use together
+DATASET_MEMORY_LIMIT_BYTES = 1024 * 1024 * 1024
+
+
+class Contest:
+    """Definition of one contest: its dataset, question bank and admin database."""
+
+    def __init__(self, contest_id, dataset_path, answers, admin_db_path):
+        self.contest_id = contest_id
+        self.dataset_path = dataset_path
+        self.answers = answers  # question_id -> correct query
+        self.admin_db_path = admin_db_path
+
+
+def load_contests(path):
+    """Read contest definitions from a JSON file shaped like
+
+        {"movies": {"dataset": "movies.db", "admin_db": "movies_contest.db",
+                    "answers": {"1": "SELECT * FROM films;", ...}}}
+
+    `admin_db` defaults to "<contest id>_contest.db".
+    """
+    with open(path) as f:
+        config = json.load(f)
+    return [
+        Contest(contest_id, spec["dataset"],
+                {int(question_id): query for question_id, query in spec["answers"].items()},
+                spec.get("admin_db", f"{contest_id}_contest.db"))
+        for contest_id, spec in config.items()
+    ]
+
+
+class ContestAdmin:
+    """Admin database of one contest and the state kept on top of it."""
+
+    def __init__(self, pool, scoreboard, leaderboard, writer, verdicts, grading_queue=None):
+        self.pool = pool
+        self.scoreboard = scoreboard
+        self.leaderboard = leaderboard
+        self.writer = writer  # GroupCommitWriter of graded submissions
+        self.verdicts = verdicts  # VerdictCache of query texts graded before
+        self.grading_queue = grading_queue
+
+    def connection(self):
+        return self.pool.connection()
+
+    def close(self):
+        """Finish the grading jobs in flight and the pending writes, then close the pool."""
+        if self.grading_queue is not None:
+            self.grading_queue.shutdown()
+        self.writer.shutdown()
+        self.verdicts.shutdown()  # after the queue: graded jobs record verdicts
+        self.leaderboard.close()
+        self.pool.close_all()
+
+
+class ContestRegistry:
+    """Contests by id, each opened on its first request.
+
+    `open_dataset(contest)` returns what its queries run on (a Grader or a
+    QuerySandbox) and `open_admin(contest)` its ContestAdmin. Datasets are
+    checked out with `with registry.dataset(contest_id) as dataset:` and
+    kept in LRU order; once their memory_bytes() add up to more than
+    `memory_limit` the least recently used ones are evicted, and reopened
+    (with fresh reference results) when asked for again. An evicted dataset
+    that is still checked out is closed when its last user is done with it.
+    Admin state is small and stays open.
+
+    memory_bytes() of a dataset must be cheap and not wait on its locks, as
+    it is read on every lookup under the registry's lock.
+    """
+
+    def __init__(self, open_dataset, open_admin, memory_limit=DATASET_MEMORY_LIMIT_BYTES):
+        self.open_dataset = open_dataset
+        self.open_admin = open_admin
+        self.memory_limit = memory_limit
+        self.evictions = 0
+        self._contests = {}
+        self._datasets = OrderedDict()  # contest_id -> Grader/QuerySandbox, oldest first
+        self._checkouts = Counter()      # dataset -> requests using it
+        self._evicted = set()            # evicted datasets to close once no request uses them
+        self._admins = {}
+        self._lock = threading.Lock()
+
+    def register(self, contest):
+        with self._lock:
+            self._contests[contest.contest_id] = contest
+
+    def get(self, contest_id):
+        """The Contest with this id, or None."""
+        return self._contests.get(contest_id)
+
+    @contextmanager
+    def dataset(self, contest_id):
+        """The contest's Grader/QuerySandbox, kept open until the block ends."""
+        with self._lock:
+            dataset = self._datasets.get(contest_id)
+            if dataset is None:
+                dataset = self.open_dataset(self._contests[contest_id])
+                self._datasets[contest_id] = dataset
+            self._datasets.move_to_end(contest_id)
+            self._checkouts[dataset] += 1
+            unused = self._evict()
+        for evicted in unused:
+            evicted.close()
+        try:
+            yield dataset
+        finally:
+            self._check_in(dataset)
+
+    def _check_in(self, dataset):
+        with self._lock:
+            self._checkouts[dataset] -= 1
+            if self._checkouts[dataset] > 0:
+                return
+            del self._checkouts[dataset]
+            if dataset not in self._evicted:
+                return
+            self._evicted.remove(dataset)
+        dataset.close()
+
+    def admin(self, contest_id):
+        with self._lock:
+            admin = self._admins.get(contest_id)
+            if admin is None:
+                admin = self._admins[contest_id] = self.open_admin(self._contests[contest_id])
+            return admin
+
+    def open_admins(self):
+        """{contest_id: ContestAdmin} of the contests opened so far."""
+        with self._lock:
+            return dict(self._admins)
+
+    def memory_usage(self):
+        return sum(dataset.memory_bytes() for dataset in self._datasets.values())
+
+    def _evict(self):
+        # Datasets grow as they are used, so this runs on every lookup; the
+        # most recently used one is never evicted. Returns the evicted datasets
+        # no request is using, for the caller to close once it let go of the lock.
+        unused = []
+        while len(self._datasets) > 1 and self.memory_usage() > self.memory_limit:
+            _, dataset = self._datasets.popitem(last=False)
+            self.evictions += 1
+            if self._checkouts[dataset]:
+                self._evicted.add(dataset)  # closed by _check_in()
+            else:
+                unused.append(dataset)
+        return unused
+
+    def close(self):
+        """Close every open admin database and dataset, e.g. when the server stops.
+
+        Datasets still in use are closed when their requests are done with
+        them. Contests asked for afterwards are opened again.
+        """
+        with self._lock:
+            admins, datasets = list(self._admins.values()), []
+            for dataset in self._datasets.values():
+                if self._checkouts[dataset]:
+                    self._evicted.add(dataset)
+                else:
+                    datasets.append(dataset)
+            self._admins.clear()
+            self._datasets.clear()
+        for admin in admins:
+            admin.close()
+        for dataset in datasets:
+            dataset.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "contests": sorted(self._contests),
+                "loaded": list(self._datasets),
+                "memory_bytes": self.memory_usage(),
+                "memory_limit": self.memory_limit,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,39 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Threads running SQLite calls for the asyncio server, shared by every database
+MAX_THREADS = 32
+# Calls running at once on one database file; SQLite releases the GIL while
+# it steps a query, so about one per core keeps the cores busy
+PER_DATABASE = os.cpu_count() or 1
+
+
+class DatabaseExecutor:
+    """Runs blocking SQLite calls for asyncio handlers on a bounded thread pool.
+
+    Handlers `await run(database, function, *args)`. At most `per_database`
+    calls run on one database file at a time and the others wait on its
+    semaphore, which holds a coroutine rather than a thread, so thousands of
+    open requests need no more than `max_threads` threads. As the limit is
+    per database, a contest with slow queries can't take every thread from
+    the admin databases or the other contests.
+    Only used from the event loop thread.
+    """
+
+    def __init__(self, max_threads=MAX_THREADS, per_database=PER_DATABASE):
+        self.per_database = per_database
+        self._executor = ThreadPoolExecutor(max_threads, thread_name_prefix="sqlite")
+        self._limits = {}  # database path -> asyncio.Semaphore
+
+    async def run(self, database, function, *args):
+        limit = self._limits.get(database)
+        if limit is None:
+            limit = self._limits[database] = asyncio.Semaphore(self.per_database)
+        async with limit:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, partial(function, *args))
+
+    def shutdown(self):
+        """Wait for the calls already running, then stop the threads."""
+        self._executor.shutdown()
@@ -0,0 +1,198 @@
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+# RAM an in_memory pool may hold in its serialized file and the connections' copies of
+# it together; connections past it, and files over half of it, are read from disk
+IN_MEMORY_MAX_BYTES = 256 * 1024 * 1024
+
+# Values of PRAGMA synchronous a pool can be configured with
+SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+def _rollback_journal_image(image):
+    # A WAL database keeps file format bytes 18/19 = 2 in its serialized image, which
+    # an in-memory connection then can't open ("unable to open database file")
+    if image[18:20] == b"\x02\x02":
+        image = bytearray(image)
+        image[18:20] = b"\x01\x01"
+        image = bytes(image)
+    return image
+
+
+class ConnectionPool:
+    """Reusable SQLite connections for one database file.
+
+    Connections are handed out with `with pool.connection() as conn:` and put
+    back when the block ends, so a request no longer pays for `sqlite3.connect`
+    and the file open every time. A borrowed connection belongs to a single
+    thread until it is returned.
+
+    With `in_memory=True` (read-only data only) the file is serialized once
+    and every connection is a private in-memory copy of it, so queries never
+    touch the disk or its locks. The copy is taken again if the file changes.
+    The image and the open copies stay within `memory_limit` bytes: once
+    another copy would not fit, new connections read the file instead.
+
+    `synchronous` sets PRAGMA synchronous on file connections: with WAL,
+    "NORMAL" keeps commits across a crash of the process but may lose the
+    last ones on power loss, "FULL" syncs every commit. None keeps SQLite's
+    default.
+
+    Each connection keeps up to `cached_statements` prepared statements, so
+    SQL text it has run before is not parsed again. An `authorizer` is
+    installed once per connection rather than per query, since replacing
+    it makes SQLite discard those statements.
+    """
+
+    def __init__(self, path, read_only=False, wal=False, busy_timeout_ms=5000, max_idle=16,
+                 in_memory=False, synchronous=None, cached_statements=128, authorizer=None,
+                 memory_limit=IN_MEMORY_MAX_BYTES):
+        if synchronous is not None and synchronous.upper() not in SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous must be one of {', '.join(sorted(SYNCHRONOUS_MODES))}")
+        self.path = path
+        self.read_only = read_only
+        self.wal = wal
+        self.busy_timeout_ms = busy_timeout_ms
+        self.in_memory = in_memory
+        self.memory_limit = memory_limit
+        self.synchronous = synchronous
+        self.cached_statements = cached_statements
+        self.authorizer = authorizer
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+        self._image = None        # serialized database, or None to read the file
+        self._image_stamp = None  # (mtime, size) of the file when it was serialized
+        self._generation = 0      # bumped whenever the image is replaced
+        self._generations = {}    # id(connection) -> generation of its copy
+        self._copies = {}         # id(connection) -> size of its copy
+        self._copy_bytes = 0      # sum of _copies, kept up to date as connections open and close
+        self._image_lock = threading.Lock()
+
+    def _open_file(self):
+        if self.read_only:
+            uri = pathlib.Path(self.path).resolve().as_uri() + "?mode=ro"
+            return sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                   timeout=self.busy_timeout_ms / 1000,
+                                   cached_statements=self.cached_statements)
+        return sqlite3.connect(self.path, check_same_thread=False,
+                               timeout=self.busy_timeout_ms / 1000,
+                               cached_statements=self.cached_statements)
+
+    def _current_image(self):
+        """Serialized copy of the file for in-memory connections (None if it is too big)."""
+        stat = os.stat(self.path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._image_lock:
+            if stamp != self._image_stamp:
+                image = None
+                # Connection.serialize/deserialize need Python 3.11+
+                if 2 * stat.st_size <= self.memory_limit and hasattr(sqlite3.Connection, "serialize"):
+                    source = self._open_file()
+                    try:
+                        image = source.serialize()
+                    finally:
+                        source.close()
+                    image = _rollback_journal_image(image)
+                self._image, self._image_stamp = image, stamp
+                self._generation += 1
+            return self._image, self._generation
+
+    def connect(self):
+        """Open and configure a brand new connection (bypasses the pool)."""
+        if self.in_memory:
+            image, generation = self._current_image()
+            if image is not None and self._reserve_copy(len(image)):
+                try:
+                    conn = sqlite3.connect(":memory:", check_same_thread=False,
+                                           cached_statements=self.cached_statements)
+                    conn.deserialize(image)
+                except BaseException:
+                    with self._image_lock:
+                        self._copy_bytes -= len(image)
+                    raise
+                with self._image_lock:
+                    self._generations[id(conn)] = generation
+                    self._copies[id(conn)] = len(image)
+                return self._configure(conn, wal=False)
+        return self._configure(self._open_file(), wal=self.wal)
+
+    def _reserve_copy(self, size):
+        # Counts a new copy of `size` bytes in, if it fits next to the image and the other copies
+        with self._image_lock:
+            if 2 * size + self._copy_bytes > self.memory_limit:
+                return False
+            self._copy_bytes += size
+            return True
+
+    def _configure(self, conn, wal):
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        if self.read_only:
+            conn.execute("PRAGMA query_only = ON")
+        if wal:
+            conn.execute("PRAGMA journal_mode = WAL")
+        if self.synchronous is not None and not self.read_only:
+            conn.execute(f"PRAGMA synchronous = {self.synchronous.upper()}")
+        if self.authorizer is not None:
+            conn.set_authorizer(self.authorizer)
+        return conn
+
+    def _is_stale(self, conn):
+        # An in-memory copy of an older version of the file
+        generation = self._generations.get(id(conn))
+        return generation is not None and generation != self._current_image()[1]
+
+    def _close(self, conn):
+        with self._image_lock:
+            self._generations.pop(id(conn), None)
+            self._copy_bytes -= self._copies.pop(id(conn), 0)
+        conn.close()
+
+    def memory_bytes(self):
+        """Bytes held by the current serialized image and the open in-memory copies.
+
+        Each copy counts with its own size, so copies of an older version of
+        the file count for what they hold until they are closed.
+        """
+        image = self._image
+        return (len(image) if image is not None else 0) + self._copy_bytes
+
+    def acquire(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with metrics.stage("connect"):
+                    return self.connect()
+            if not self._is_stale(conn):
+                return conn
+            self._close(conn)
+
+    def release(self, conn):
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (sqlite3.Error, queue.Full):
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
@@ -0,0 +1,196 @@
+import metrics
+from budget import ExecutionBudget
+from comparator import Fingerprint, build_reference, column_names, cursor_matches, fingerprint_matches
+from db_pool import ConnectionPool
+from query_plan import PlanAnalyzer
+from reference_cache import ReferenceCache
+from validator import authorizer_errors, read_only_authorizer, validate_query
+
+# Rows fetched (and sent on) at a time when a page of results is streamed
+STREAM_BATCH_ROWS = 100
+# Prepared statements each dataset connection keeps, by exact SQL text
+STATEMENT_CACHE_SIZE = 512
+# Bytes a graded answer may return past the size of its reference (room for the
+# one extra row the comparison reads before it gives up)
+GRADING_BYTES_SLACK = 64 * 1024
+
+
+def grading_limits(budget, expected_rows, expected_bytes):
+    # (max_rows, max_bytes) for grading: the comparison stops one row past the
+    # reference, so a correct answer never needs more, and a reference bigger
+    # than the budget's limits mustn't make its answer fail. expected_bytes is
+    # None for fingerprints compiled before their size was recorded.
+    max_bytes = budget.max_bytes
+    if expected_bytes is not None:
+        max_bytes = max(max_bytes, expected_bytes + GRADING_BYTES_SLACK)
+    return max(budget.max_rows, expected_rows + 1), max_bytes
+
+
+def grade_user_query(user_conn, reference, user_query, budget):
+    # user_conn must carry read_only_authorizer (Grader's pool installs it)
+    # Execute user's query and compare results while streaming them (row order only
+    # matters if the correct query has ORDER BY); stops at the first row that can't match
+    max_rows, max_bytes = grading_limits(budget, reference.row_count, reference.size_bytes)
+    with authorizer_errors(), budget.run(user_conn, max_rows, max_bytes) as tracker:
+        try:
+            user_cursor = user_conn.cursor()
+            with metrics.stage("user_query"):
+                user_cursor.execute(user_query)
+            with metrics.stage("compare"):
+                is_correct = 1 if cursor_matches(reference, user_cursor, tracker) else 0
+            user_cursor.close()
+        finally:
+            metrics.observe_rows("grade", tracker.rows)
+    return is_correct
+
+
+class Grader:
+    """Grades contestant queries against the correct answers for one dataset.
+
+    Owns the read-only dataset pool and the reference-result cache, so it can
+    be rebuilt as-is inside a worker process with
+    `Grader.from_worker_args(*grader.worker_args())`.
+    grade(), check() and stream_page() are also offered by sandbox.QuerySandbox,
+    which runs them in separate processes instead.
+    """
+
+    def __init__(self, user_db_path, answers, budget, in_memory=False):
+        self.user_db_path = user_db_path
+        self.answers = answers
+        self.budget = budget
+        self.in_memory = in_memory
+        # in_memory: queries run on RAM copies of the dataset instead of the file.
+        # Connections keep the read-only authorizer and their prepared statements
+        # for good, so a query text seen before skips parsing and authorization.
+        self.user_pool = ConnectionPool(user_db_path, read_only=True, in_memory=in_memory,
+                                        cached_statements=STATEMENT_CACHE_SIZE,
+                                        authorizer=read_only_authorizer)
+        self.reference_cache = ReferenceCache(user_db_path, answers, self.run_reference_query)
+        self.plan_analyzer = PlanAnalyzer(user_db_path)
+
+    @classmethod
+    def from_worker_args(cls, user_db_path, answers, budget_settings, in_memory):
+        return cls(user_db_path, answers, ExecutionBudget(**budget_settings), in_memory)
+
+    def run_reference_query(self, query):
+        with self.user_pool.connection() as conn:
+            return build_reference(conn.cursor(), query)
+
+    def reference(self, question_id):
+        reference = self.reference_cache.get(question_id)
+        if reference is None:
+            raise ValueError("Correct query not defined for this question.")
+        return reference
+
+    def check_plan(self, user_conn, user_query):
+        """Refuse (BudgetExceeded "cost") a query whose plan is over budget.max_plan_cost."""
+        if self.budget.max_plan_cost is None:
+            return
+        with metrics.stage("plan"):
+            self.plan_analyzer.check(user_conn, user_query, self.budget.max_plan_cost)
+
+    def grade_on(self, user_conn, question_id, user_query):
+        """Grade on a connection the caller already holds; returns 1 or 0.
+
+        Raises QueryRejected, BudgetExceeded, ValueError (unknown question) or
+        sqlite3.Error (the query itself failed).
+        """
+        validate_query(user_query)
+        self.check_plan(user_conn, user_query)
+        return grade_user_query(user_conn, self.reference(question_id), user_query, self.budget)
+
+    def grade(self, question_id, user_query):
+        with self.user_pool.connection() as user_conn:
+            return self.grade_on(user_conn, question_id, user_query)
+
+    def check_on(self, user_conn, question, user_query):
+        """Grade against a `questions` row: its compiled fingerprint, else its correct query."""
+        validate_query(user_query)
+        self.check_plan(user_conn, user_query)
+        fingerprint = Fingerprint.from_record(question)
+        cursor = user_conn.cursor()
+        if fingerprint is None:
+            reference = build_reference(cursor, question["correct_query"])
+        expected = fingerprint if fingerprint is not None else reference
+        max_rows, max_bytes = grading_limits(self.budget, expected.row_count, expected.size_bytes)
+        with authorizer_errors(), self.budget.run(user_conn, max_rows, max_bytes) as tracker:
+            try:
+                with metrics.stage("user_query"):
+                    cursor.execute(user_query)
+                with metrics.stage("compare"):
+                    if fingerprint is not None:
+                        matched = fingerprint_matches(fingerprint, cursor, tracker)
+                    else:
+                        matched = cursor_matches(reference, cursor, tracker)
+                cursor.close()
+            finally:
+                metrics.observe_rows("check", tracker.rows)
+        return 1 if matched else 0
+
+    def check(self, question, user_query):
+        with self.user_pool.connection() as user_conn:
+            return self.check_on(user_conn, question, user_query)
+
+    def stream_page_on(self, user_conn, user_query, offset, limit):
+        """Run a query for display and yield one page of its result as it is fetched.
+
+        Yields ("columns", names), then ("rows", [row tuples]) batches of up
+        to STREAM_BATCH_ROWS, then ("end", more), `more` telling whether rows
+        follow the page. The `offset` rows before the page are skipped
+        without being kept; only the page's rows count against the row and
+        byte limits.
+        """
+        validate_query(user_query)
+        self.check_plan(user_conn, user_query)
+        with authorizer_errors(), self.budget.run(user_conn) as tracker:
+            try:
+                cursor = user_conn.cursor()
+                with metrics.stage("user_query"):
+                    cursor.execute(user_query)
+                yield "columns", column_names(cursor)
+                while offset > 0:
+                    skipped = len(cursor.fetchmany(min(offset, STREAM_BATCH_ROWS)))
+                    if not skipped:
+                        break
+                    offset -= skipped
+                remaining = limit
+                while remaining > 0:
+                    batch = cursor.fetchmany(min(remaining, STREAM_BATCH_ROWS))
+                    if not batch:
+                        break
+                    remaining -= len(batch)
+                    yield "rows", [tuple(row) for row in tracker.track(batch)]
+                yield "end", remaining == 0 and cursor.fetchone() is not None
+                cursor.close()
+            finally:
+                metrics.observe_rows("view", tracker.rows)
+
+    def stream_page(self, user_query, offset, limit):
+        """stream_page_on() on a pooled connection, held until the page is done."""
+        with self.user_pool.connection() as user_conn:
+            yield from self.stream_page_on(user_conn, user_query, offset, limit)
+
+    def page_on(self, user_conn, user_query, offset, limit):
+        """One page of a query's result at once: (column names, list of row tuples, more)."""
+        rows = []
+        for kind, value in self.stream_page_on(user_conn, user_query, offset, limit):
+            if kind == "columns":
+                columns = value
+            elif kind == "rows":
+                rows.extend(value)
+            else:
+                more = value
+        return columns, rows, more
+
+    def memory_bytes(self):
+        return self.user_pool.memory_bytes() + self.reference_cache.memory_bytes()
+
+    def warm(self):
+        """Load the dataset and compute every reference result now."""
+        self.reference_cache.warm()
+
+    def close(self):
+        self.user_pool.close_all()
+
+    def worker_args(self):
+        return (self.user_db_path, dict(self.answers), vars(self.budget).copy(), self.in_memory)
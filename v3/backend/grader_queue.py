@@ -0,0 +1,222 @@
+import multiprocessing
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from grader import Grader
+from sandbox import MEMORY_LIMIT_BYTES, apply_memory_limit, cpu_seconds_for, limit_cpu
+
+GRADING_JOBS_TABLE = '''
+CREATE TABLE IF NOT EXISTS grading_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    user_query TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued, running, done, error
+    is_correct INTEGER,
+    error TEXT,
+    created_at REAL NOT NULL,
+    claimed_at REAL,
+    finished_at REAL
+)
+'''
+
+# A job left 'running' this long (its server died mid-grade, or storing its result
+# failed) is queued again
+STALE_JOB_SECONDS = 300
+# How often the dispatcher looks for such jobs
+REQUEUE_INTERVAL_SECONDS = 30
+# How often the dispatcher checks for jobs queued by other server processes
+POLL_INTERVAL_SECONDS = 0.5
+
+# Error of a job whose (user, question) pair got a submission while it was queued
+ALREADY_SUBMITTED = "You have already submitted an answer for this question."
+
+
+# --- runs inside the grader worker processes ---
+
+_worker_grader = None
+
+
+def _init_worker(*grader_args):
+    global _worker_grader
+    # Same limits as the query sandbox; a worker killed by them breaks the
+    # pool, which _outcome() replaces
+    apply_memory_limit(MEMORY_LIMIT_BYTES)
+    _worker_grader = Grader.from_worker_args(*grader_args)
+
+
+def _grade_in_worker(question_id, user_query):
+    limit_cpu(cpu_seconds_for(_worker_grader.budget))
+    # Stage timings go back with the outcome and are recorded by the server
+    with metrics.REGISTRY.capture() as observations:
+        try:
+            outcome = "done", _worker_grader.grade(question_id, user_query), None
+        except Exception as e:
+            outcome = "error", None, str(e)
+    return observations, outcome
+
+
+# --- runs in the web server process ---
+
+class GradingQueue:
+    """Durable queue of submissions (the `grading_jobs` table) graded by a process pool.
+
+    enqueue() only inserts a row, so the HTTP request returns immediately. A
+    dispatcher thread, started by start() or the first enqueue(), claims
+    queued jobs (also those left by an earlier run of the server), runs them
+    on `workers` grader processes and stores each result with
+    `store_result(cursor, job, is_correct)` in the same transaction that
+    marks the job done. store_result returns whether the submission was
+    stored; if the pair was answered meanwhile (e.g. from the verdict
+    cache) the job ends as an error instead, so it never reports a grade
+    other than the stored one.
+    """
+
+    def __init__(self, connection, grader, workers, store_result, on_stored=None,
+                 poll_interval=POLL_INTERVAL_SECONDS):
+        self.connection = connection  # () -> context manager yielding an admin connection
+        self.grader = grader
+        self.workers = workers
+        self.store_result = store_result
+        self.on_stored = on_stored
+        self.poll_interval = poll_interval
+        self.max_in_flight = workers * 2
+        self._in_flight = 0
+        self._executor = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def enqueue(self, user_id, question_id, user_query):
+        """Queue a submission; returns its id, or None if the pair is already queued."""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            pending = conn.execute(
+                "SELECT 1 FROM grading_jobs WHERE user_id = ? AND question_id = ? AND status IN ('queued', 'running')",
+                (user_id, question_id)).fetchone()
+            if pending:
+                conn.rollback()
+                return None
+            cursor = conn.execute(
+                "INSERT INTO grading_jobs (user_id, question_id, user_query, created_at) VALUES (?, ?, ?, ?)",
+                (user_id, question_id, user_query, time.time()))
+            conn.commit()
+        self.start()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def status(self, job_id):
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT id, user_id, question_id, status, is_correct, error, created_at, finished_at "
+                "FROM grading_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def start(self):
+        """Start the dispatcher, if it isn't running, to grade the jobs already queued."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="grading-dispatcher", daemon=True)
+                self._thread.start()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=self.grader.worker_args())
+
+    def _run(self):
+        next_requeue = 0
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() >= next_requeue:
+                    self._requeue_stale()
+                    next_requeue = time.monotonic() + REQUEUE_INTERVAL_SECONDS
+                with self._lock:
+                    free = self.max_in_flight - self._in_flight
+                jobs = self._claim(free) if free > 0 else []
+            except sqlite3.OperationalError:
+                jobs = []  # e.g. the database is locked; try again on the next round
+            for job in jobs:
+                self._submit(job)
+            if not jobs:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _requeue_stale(self):
+        with self.connection() as conn:
+            conn.execute("UPDATE grading_jobs SET status = 'queued' WHERE status = 'running' AND claimed_at < ?",
+                         (time.time() - STALE_JOB_SECONDS,))
+            conn.commit()
+
+    def _claim(self, limit):
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            jobs = [dict(row) for row in conn.execute(
+                "SELECT id, user_id, question_id, user_query FROM grading_jobs "
+                "WHERE status = 'queued' ORDER BY id LIMIT ?", (limit,))]
+            conn.executemany("UPDATE grading_jobs SET status = 'running', claimed_at = ? WHERE id = ?",
+                             [(time.time(), job["id"]) for job in jobs])
+            conn.commit()
+        return jobs
+
+    def _submit(self, job):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+            executor = self._executor
+            self._in_flight += 1
+        try:
+            future = executor.submit(_grade_in_worker, job["question_id"], job["user_query"])
+        except BrokenProcessPool:
+            self._finish(job, ("error", None, "Grader crashed, please resubmit"))
+            return
+        future.add_done_callback(lambda f: self._finish(job, self._outcome(f, executor)))
+
+    def _outcome(self, future, executor):
+        try:
+            observations, outcome = future.result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed); start a fresh pool for later jobs
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            return "error", None, "Grader crashed, please resubmit"
+        except Exception as e:
+            return "error", None, str(e)
+        metrics.REGISTRY.replay(observations)
+        return outcome
+
+    def _finish(self, job, outcome):
+        status, is_correct, error = outcome
+        try:
+            with self.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if status == "done" and not self.store_result(conn.cursor(), job, is_correct):
+                    status, is_correct, error = "error", None, ALREADY_SUBMITTED
+                conn.execute("UPDATE grading_jobs SET status = ?, is_correct = ?, error = ?, finished_at = ? WHERE id = ?",
+                             (status, is_correct, error, time.time(), job["id"]))
+                conn.commit()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._wake.set()
+        if status == "done" and self.on_stored is not None:
+            self.on_stored()
+
+    def shutdown(self, wait=True):
+        """Stop claiming jobs and let the in-flight ones finish (if `wait`)."""
+        self._stopping.set()
+        self._wake.set()
+        with self._lock:
+            thread, executor = self._thread, self._executor
+        if thread is not None:
+            thread.join()
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+# A batch is committed once it holds this many records...
+MAX_BATCH_RECORDS = 256
+# ...or this long after its first record was queued
+MAX_DELAY_SECONDS = 0.005
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """Writes records queued by many requests in shared transactions (group commit).
+
+    A request calls write(record), which blocks until the transaction that
+    holds the record has committed and returns what `write_batch(cursor,
+    records)` reported for it (one result per record, in order). A writer
+    thread gathers queued records into one transaction every `max_delay`
+    seconds or `max_batch` records, so a burst of submissions costs one
+    fsync and one write lock per batch instead of one per request. If the
+    transaction fails, every write() in the batch raises its error.
+    How durable a commit is follows the connection's `synchronous` pragma.
+    """
+
+    def __init__(self, connection, write_batch, max_batch=MAX_BATCH_RECORDS,
+                 max_delay=MAX_DELAY_SECONDS, on_flushed=None):
+        self.connection = connection  # () -> context manager yielding a connection
+        self.write_batch = write_batch
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.on_flushed = on_flushed  # called after each committed batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def submit(self, record):
+        """Queue a record; the returned Future resolves once it is committed."""
+        future = Future()
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("The writer has been shut down")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+            self._queue.put((record, future))
+        return future
+
+    def write(self, record, timeout=None):
+        return self.submit(record).result(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                # Take what is already queued even when the delay is used up
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        records = [record for record, _ in batch]
+        try:
+            with metrics.stage("group_commit"), self.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                results = self.write_batch(conn.cursor(), records)
+                conn.commit()
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        metrics.REGISTRY.observe("commit_batch_records", len(batch))
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        if self.on_flushed is not None:
+            self.on_flushed()
+
+    def shutdown(self):
+        """Commit everything queued so far, then stop the writer thread."""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
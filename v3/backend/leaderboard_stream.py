@@ -0,0 +1,125 @@
+import json
+import queue
+import threading
+
+# How often the broadcaster looks for scoreboard changes made by other workers
+POLL_INTERVAL_SECONDS = 1.0
+# Comment line sent to idle streams so proxies don't close them
+KEEPALIVE_SECONDS = 15.0
+# Updates buffered per subscriber before a slow client is dropped
+SUBSCRIBER_BACKLOG = 64
+
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def leaderboard_delta(previous, current):
+    """Rows of `current` that differ from `previous` by rank, plus the new length."""
+    changes = [
+        dict(entry, rank=rank)
+        for rank, entry in enumerate(current, start=1)
+        if rank > len(previous) or previous[rank - 1] != entry
+    ]
+    return {"changes": changes, "size": len(current)}
+
+
+class LeaderboardBroadcaster:
+    """Pushes top-K scoreboard changes to every Server-Sent Events subscriber.
+
+    One background thread syncs the scoreboard and computes the delta; the
+    serialized event is then handed to all subscriber queues, so the cost of
+    an update doesn't grow with the number of viewers.
+    """
+
+    def __init__(self, scoreboard, connection, top_k=10, interval=POLL_INTERVAL_SECONDS):
+        self.scoreboard = scoreboard
+        self.connection = connection  # () -> context manager yielding an admin connection
+        self.top_k = top_k
+        self.interval = interval
+        self._top = []
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def notify(self):
+        """Ask for an immediate check, e.g. right after a submission was committed."""
+        self._wake.set()
+
+    def _ensure_running(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="leaderboard-broadcaster", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                self._publish_changes()
+            except Exception:
+                continue  # e.g. database locked; try again next round
+
+    def _publish_changes(self):
+        # Compare against what was last published rather than trusting sync()'s
+        # return value: /winners and new subscribers sync the same scoreboard
+        with self.connection() as conn:
+            self.scoreboard.sync(conn)
+        top = self.scoreboard.top(self.top_k)
+        if top == self._top:
+            return
+        event = sse_event("update", leaderboard_delta(self._top, top))
+        self._top = top
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber):
+        # Too far behind: end its stream, the browser's EventSource reconnects
+        with self._lock:
+            self._subscribers.discard(subscriber)
+        with subscriber.mutex:
+            subscriber.queue.clear()
+        subscriber.put_nowait(None)
+
+    def close(self):
+        """End every open stream; their browsers reconnect (to another worker if this one stops)."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            self._drop(subscriber)
+
+    def stream(self):
+        """Generator of SSE text: a snapshot of the current top-K, then deltas."""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        with self.connection() as conn:
+            self.scoreboard.sync(conn)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            snapshot = self.scoreboard.top(self.top_k)
+        self._ensure_running()
+        try:
+            yield sse_event("snapshot", {"changes": [dict(e, rank=r) for r, e in enumerate(snapshot, start=1)],
+                                         "size": len(snapshot)})
+            while True:
+                try:
+                    event = subscriber.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                yield event
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
@@ -0,0 +1,163 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the result-size histogram buckets
+ROW_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}  # labels -> [count per bucket..., sum, count]
+
+    def observe(self, value, labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_text(labels + (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_text(labels + (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_label_text(labels)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_label_text(labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._series = {}  # labels -> value
+
+    def observe(self, amount, labels):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{_label_text(labels)} {_number(value)}")
+        return lines
+
+
+class Registry:
+    """Histograms and counters rendered in the Prometheus text format.
+
+    Values kept elsewhere (cache statistics, pool sizes) are added with
+    collector(). Worker processes wrap a job in capture() and send the
+    observations back, and the server replay()s them, so stages that ran
+    in a sandbox or grader process still show up in this process' /metrics.
+    """
+
+    def __init__(self, prefix="contest_"):
+        self.prefix = prefix
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        self._metrics[name] = Histogram(self.prefix + name, help, buckets)
+
+    def counter(self, name, help):
+        self._metrics[name] = Counter(self.prefix + name, help)
+
+    def collector(self, function):
+        """Add a `() -> [(name, type, help, [(labels dict, value), ...]), ...]` callback."""
+        self._collectors.append(function)
+
+    def _record(self, name, value, labels):
+        captured = getattr(self._local, "captured", None)
+        if captured is not None:
+            captured.append((name, labels, value))
+            return
+        with self._lock:
+            self._metrics[name].observe(value, labels)
+
+    def observe(self, name, value, **labels):
+        self._record(name, value, tuple(sorted(labels.items())))
+
+    def inc(self, name, amount=1, **labels):
+        self._record(name, amount, tuple(sorted(labels.items())))
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def capture(self):
+        """Collect this thread's observations into a list instead of recording them."""
+        observations = []
+        self._local.captured = observations
+        try:
+            yield observations
+        finally:
+            self._local.captured = None
+
+    def replay(self, observations):
+        for name, labels, value in observations:
+            self._record(name, value, tuple(tuple(pair) for pair in labels))
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in self._metrics.values():
+                lines.extend(metric.render())
+        for function in self._collectors:
+            for name, kind, help, samples in function():
+                name = self.prefix + name
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    lines.append(f"{name}{_label_text(tuple(sorted(labels.items())))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REGISTRY.histogram("request_seconds", "Time to answer an HTTP request.")
+REGISTRY.histogram("stage_seconds", "Time spent in one stage of handling a request.")
+REGISTRY.histogram("query_rows", "Rows read from a contestant query.", ROW_BUCKETS)
+REGISTRY.counter("reference_cache_lookups_total", "Reference result lookups, by hit or miss.")
+REGISTRY.counter("slow_queries_total", "Contestant queries slower than the slow-query threshold.")
+REGISTRY.histogram("commit_batch_records", "Submissions written per group commit.", ROW_BUCKETS)
+
+
+def stage(name, **labels):
+    """Time a block as one stage: `with metrics.stage("user_query"): ...`"""
+    return REGISTRY.timer("stage_seconds", stage=name, **labels)
+
+
+def observe_rows(kind, rows):
+    REGISTRY.observe("query_rows", rows, kind=kind)
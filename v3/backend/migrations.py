@@ -0,0 +1,122 @@
+import sqlite3
+
+from grader_queue import GRADING_JOBS_TABLE
+from scoreboard import scoreboard_backfill
+from verdict_cache import GRADE_VERDICTS_TABLE
+
+# Each schema is a list of (version, description, statements). Applied versions
+# are recorded per schema in `schema_migrations`, so running the list again is a
+# no-op and several backends can share one database file.
+
+
+def _create_submissions(score_column):
+    return f'''
+    CREATE TABLE IF NOT EXISTS submissions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        question_id INTEGER NOT NULL,
+        user_query TEXT NOT NULL,
+        {score_column} INTEGER NOT NULL DEFAULT 0,
+        UNIQUE(user_id, question_id) -- Prevent multiple submissions per question
+    )
+    '''
+
+
+def _submission_indexes(score_column, scores_table, total_column):
+    return [
+        (2, "one submission per (user_id, question_id)", [
+            # Keep the first answer of any pair submitted more than once; the later
+            # ones are moved to submissions_duplicates, since scores computed
+            # before this migration may have counted them
+            "CREATE TABLE IF NOT EXISTS submissions_duplicates AS SELECT * FROM submissions WHERE 0",
+            '''INSERT INTO submissions_duplicates SELECT * FROM submissions WHERE id NOT IN (
+                   SELECT MIN(id) FROM submissions GROUP BY user_id, question_id)''',
+            '''DELETE FROM submissions WHERE id NOT IN (
+                   SELECT MIN(id) FROM submissions GROUP BY user_id, question_id)''',
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_submissions_user_question ON submissions (user_id, question_id)",
+        ]),
+        (3, "covering index for per-user score sums", [
+            f"CREATE INDEX IF NOT EXISTS idx_submissions_user_score ON submissions (user_id, {score_column})",
+        ]),
+        (4, "index for leaderboard ordering", [
+            f"CREATE INDEX IF NOT EXISTS idx_{scores_table}_{total_column} ON {scores_table} ({total_column} DESC, user_id)",
+        ]),
+    ]
+
+
+# v3/backend/test3.py (contest.db)
+CONTEST_MIGRATIONS = [
+    (1, "create submissions and final_scores", [
+        _create_submissions("is_correct"),
+        "CREATE TABLE IF NOT EXISTS final_scores (user_id TEXT PRIMARY KEY, score INTEGER NOT NULL)",
+    ]),
+] + _submission_indexes("is_correct", "final_scores", "score") + [
+    (5, "live scoreboard", scoreboard_backfill("is_correct")),
+    (6, "queue of submissions waiting for a grader", [
+        GRADING_JOBS_TABLE,
+        "CREATE INDEX IF NOT EXISTS idx_grading_jobs_status ON grading_jobs (status, id)",
+        "CREATE INDEX IF NOT EXISTS idx_grading_jobs_user_question ON grading_jobs (user_id, question_id)",
+    ]),
+    (7, "verdicts of graded query texts", [GRADE_VERDICTS_TABLE]),
+]
+
+# test.py (contest_db.sqlite as created by data.py)
+QUERY_CONTEST_MIGRATIONS = [
+    (1, "create submissions and final_scores", [
+        _create_submissions("score"),
+        "CREATE TABLE IF NOT EXISTS final_scores (user_id TEXT PRIMARY KEY, score INTEGER NOT NULL)",
+    ]),
+] + _submission_indexes("score", "final_scores", "score") + [
+    (5, "live scoreboard", scoreboard_backfill("score")),
+]
+
+# test2.py (contest_db.sqlite)
+PRACTICE_MIGRATIONS = [
+    (1, "create submissions and scores", [
+        _create_submissions("is_correct"),
+        "CREATE TABLE IF NOT EXISTS scores (user_id TEXT PRIMARY KEY, total_score INTEGER DEFAULT 0)",
+    ]),
+] + _submission_indexes("is_correct", "scores", "total_score")
+
+
+def applied_versions(conn, schema):
+    rows = conn.execute("SELECT version FROM schema_migrations WHERE schema = ?", (schema,))
+    return {row[0] for row in rows}
+
+
+def run_migrations(conn, schema, migrations):
+    """Apply the migrations of `schema` that haven't run yet, each in its own transaction.
+
+    Returns the versions that were applied by this call.
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        schema TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        description TEXT NOT NULL,
+        applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (schema, version)
+    )
+    ''')
+    conn.commit()
+
+    applied = []
+    for version, description, statements in sorted(migrations, key=lambda m: m[0]):
+        if version in applied_versions(conn, schema):
+            continue
+        # BEGIN IMMEDIATE so two workers starting together can't both apply it
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version in applied_versions(conn, schema):
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute("INSERT INTO schema_migrations (schema, version, description) VALUES (?, ?, ?)",
+                         (schema, version, description))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
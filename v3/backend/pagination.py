@@ -0,0 +1,98 @@
+import base64
+import hashlib
+import json
+
+from budget import BudgetExceeded
+from sql_text import normalize_sql
+
+# Rows per /view_output page when the request doesn't ask for a size, and the most it may ask for
+DEFAULT_PAGE_ROWS = 500
+MAX_PAGE_ROWS = 1000
+
+
+def _query_key(sql):
+    return hashlib.sha256(normalize_sql(sql).encode()).hexdigest()[:16]
+
+
+def encode_cursor(sql, offset):
+    """Opaque token for the page of `sql`'s result that starts at row `offset`."""
+    token = json.dumps([offset, _query_key(sql)]).encode()
+    return base64.urlsafe_b64encode(token).decode().rstrip("=")
+
+
+def decode_cursor(sql, cursor):
+    """Row offset a cursor points at (0 for none); ValueError if it isn't one of `sql`'s."""
+    if not cursor:
+        return 0
+    try:
+        offset, key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor") from None
+    if key != _query_key(sql) or not isinstance(offset, int) or offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
+
+
+def page_size(requested):
+    """Rows to return for a requested page size (None: the default); ValueError if it isn't a number."""
+    if requested is None:
+        return DEFAULT_PAGE_ROWS
+    try:
+        return max(1, min(int(requested), MAX_PAGE_ROWS))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be a number") from None
+
+
+def columnar_json(events, next_cursor, on_complete=None):
+    """Render a page stream (see Grader.stream_page) as chunks of a JSON body:
+
+        {"columns": ["id", "title"], "rows": [[1, "Dune"], ...], "next_cursor": "..." or null}
+
+    Column names are sent once and each row is an array, written as soon as
+    it is fetched. `next_cursor()` gives the cursor of the following page.
+    The query runs on the first next(), so errors in it raise from there,
+    before any response is started; a limit hit later, while rows are being
+    sent, ends the body with "error" (and "budget_exceeded") fields instead.
+    With `on_complete`, it is called with the whole body once the page is
+    complete (used to cache it).
+    """
+    parts = [] if on_complete is not None else None
+
+    def emit(chunk):
+        if parts is not None:
+            parts.append(chunk)
+        return chunk
+
+    kind, columns = next(events)
+    yield emit('{"columns": ' + json.dumps(columns) + ', "rows": [')
+    separator = ""
+    try:
+        for kind, value in events:
+            if kind == "rows":
+                if value:
+                    yield emit(separator + ", ".join(json.dumps(list(row)) for row in value))
+                    separator = ", "
+            elif kind == "end":
+                cursor = next_cursor() if value else None
+                yield emit('], "next_cursor": ' + json.dumps(cursor) + "}")
+    except Exception as e:
+        error = {"next_cursor": None, "error": str(e)}
+        if isinstance(e, BudgetExceeded):
+            error["budget_exceeded"] = e.limit
+        yield "], " + json.dumps(error)[1:]
+        return
+    finally:
+        events.close()  # also when the client went away: gives the connection back
+    if on_complete is not None:
+        on_complete("".join(parts).encode())
+
+
+def started(chunks):
+    """Advance `chunks` to its first chunk now, so errors raise here rather than
+    mid-response, and return a generator of all of its chunks."""
+    first = next(chunks)
+
+    def body():
+        yield first
+        yield from chunks
+    return body()
@@ -0,0 +1,340 @@
+import math
+import threading
+from collections import OrderedDict
+
+from budget import BudgetExceeded
+from reference_cache import file_fingerprint
+from sql_text import KEYWORDS, normalize_sql, tokenize
+from validator import authorizer_errors
+
+# Full scans of tables with more rows than this are named in the verdict
+LARGE_TABLE_ROWS = 100_000
+# The guesses below lean low: a query that is underestimated still runs into
+# its execution budget, while one that is overestimated is refused for nothing.
+# Rows an index SEARCH on an equality is assumed to return (a rowid lookup returns one)
+SEARCH_EQUALITY_ROWS = 10
+# Share of a table an index SEARCH on a range is assumed to return
+SEARCH_RANGE_SHARE = 1 / 16
+# Plan verdicts remembered per dataset, by normalized query text
+VERDICT_CACHE_SIZE = 4096
+
+
+class PlanVerdict:
+    """Estimated cost of a query (rows read, inf if it may never finish) and why it is high."""
+
+    def __init__(self, cost, problems):
+        self.cost = cost
+        self.problems = problems
+
+    def describe(self):
+        if math.isinf(self.cost):
+            estimate = "it may never finish"
+        else:
+            estimate = f"about {self.cost:,.0f} row reads"
+        if self.problems:
+            return f"{estimate}: {'; '.join(self.problems)}"
+        return estimate
+
+
+def _word(token):
+    kind, text = token
+    return text.upper() if kind == "word" else None
+
+
+def _identifier(token):
+    kind, text = token
+    if kind == "word":
+        return text.lower()
+    if kind == "quoted":
+        return text[1:-1].lower()
+    return None
+
+
+def _skip_parens(tokens, i):
+    """Index just past the parenthesized group that opens at tokens[i]."""
+    depth = 0
+    while i < len(tokens):
+        if tokens[i] == ("op", "("):
+            depth += 1
+        elif tokens[i] == ("op", ")"):
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def _top_level_words(tokens):
+    words = set()
+    depth = 0
+    for token in tokens:
+        if token == ("op", "("):
+            depth += 1
+        elif token == ("op", ")"):
+            depth -= 1
+        elif depth == 0 and _word(token):
+            words.add(_word(token))
+    return words
+
+
+def unbounded_recursion(tokens):
+    """True if a WITH RECURSIVE query has a recursive step that nothing stops.
+
+    A recursive step (the part after UNION) without WHERE, JOIN/ON or LIMIT
+    adds rows forever, unless the main statement takes a LIMIT of them
+    without sorting or grouping all of them first. Anything subtler is
+    left to the execution budget.
+    """
+    if len(tokens) < 2 or _word(tokens[0]) != "WITH" or _word(tokens[1]) != "RECURSIVE":
+        return False
+    steps = []
+    i = 2
+    while i < len(tokens):
+        # <name> [(<columns>)] AS [NOT] [MATERIALIZED] (<body>)
+        while i < len(tokens) and _word(tokens[i]) != "AS":
+            i = _skip_parens(tokens, i) if tokens[i] == ("op", "(") else i + 1
+        while i < len(tokens) and tokens[i] != ("op", "("):
+            i += 1
+        end = _skip_parens(tokens, i)
+        body = tokens[i + 1:end - 1]
+        depth = 0
+        for index, token in enumerate(body):
+            if token == ("op", "("):
+                depth += 1
+            elif token == ("op", ")"):
+                depth -= 1
+            elif depth == 0 and _word(token) == "UNION":
+                steps.append(body[index + 1:])
+                break
+        i = end
+        if i < len(tokens) and tokens[i] == ("op", ","):
+            i += 1
+            continue
+        break
+
+    stoppers = {"WHERE", "JOIN", "ON", "LIMIT"}
+    if all(stoppers & {_word(token) for token in step} for step in steps):
+        return False
+    main = _top_level_words(tokens[i:])
+    return "LIMIT" not in main or bool({"ORDER", "GROUP"} & main)
+
+
+def aliases(tokens):
+    """Map the aliases a query may use (`books b`, `orders AS o`) to the names they stand for.
+
+    Column aliases are picked up too; they are never looked up, as plans
+    only name tables, CTEs and subqueries.
+    """
+    found = {}
+    for i, token in enumerate(tokens[:-1]):
+        name = _identifier(token)
+        if name is None or name.upper() in KEYWORDS:
+            continue
+        following = tokens[i + 1]
+        if _word(following) == "AS" and i + 2 < len(tokens):
+            following = tokens[i + 2]
+        alias = _identifier(following)
+        if alias is not None and alias.upper() not in KEYWORDS:
+            found[alias] = name
+    return found
+
+
+def exists_sources(tokens):
+    """Names (tables and aliases) in the FROM clauses of EXISTS (...) subqueries.
+
+    The plan doesn't say which correlated subqueries are EXISTS ones; their
+    first SCAN/SEARCH names one of these.
+    """
+    found = set()
+    for i, token in enumerate(tokens[:-1]):
+        if _word(token) != "EXISTS" or tokens[i + 1] != ("op", "("):
+            continue
+        depth = 0
+        in_from = False
+        for inner in tokens[i + 1:_skip_parens(tokens, i + 1)]:
+            if inner == ("op", "("):
+                depth += 1
+            elif inner == ("op", ")"):
+                depth -= 1
+            elif depth == 1 and _word(inner) in ("FROM", "JOIN"):
+                in_from = True
+            elif depth == 1 and _word(inner) in ("WHERE", "ON", "USING", "GROUP", "ORDER", "LIMIT"):
+                in_from = False
+            elif depth == 1 and in_from:
+                name = _identifier(inner)
+                if name is not None and name.upper() not in KEYWORDS:
+                    found.add(name)
+    return found
+
+
+class PlanAnalyzer:
+    """Estimates what a contestant query costs from EXPLAIN QUERY PLAN, before it runs.
+
+    The plan is walked as SQLite's nested loops: each SCAN reads every row
+    of its table (row counts are taken once per version of the dataset
+    file) for every row of the loops around it, a SEARCH reads a few rows
+    per lookup, and correlated subqueries run once per outer row (an
+    EXISTS one at the cost of a lookup, as it stops at its first row). So a
+    join with no usable index multiplies table sizes, and a recursive CTE
+    with no stop condition is reported as never finishing. The estimate is
+    rough; it only has to catch queries no budget would let finish.
+    Verdicts are cached by normalized query text until the dataset changes.
+    """
+
+    def __init__(self, db_path, cache_size=VERDICT_CACHE_SIZE):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._verdicts = OrderedDict()  # normalized sql -> PlanVerdict, oldest first
+        self._table_rows = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _check_database(self):
+        stamp = file_fingerprint(self.db_path)
+        if stamp != self._stamp:
+            self._verdicts.clear()
+            self._table_rows = None
+            self._stamp = stamp
+
+    def _count_rows(self, conn):
+        names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        return {
+            name.lower(): conn.execute('SELECT COUNT(*) FROM "{}"'.format(name.replace('"', '""'))).fetchone()[0]
+            for name in names
+        }
+
+    def verdict(self, conn, sql):
+        """PlanVerdict for `sql` on the dataset `conn` is open on.
+
+        `conn` is expected to carry the read-only authorizer (as the Grader's
+        pool connections do). Raises QueryRejected or sqlite3.Error when the
+        query can't be planned.
+        """
+        key = normalize_sql(sql)
+        with self._lock:
+            self._check_database()
+            verdict = self._verdicts.get(key)
+            if verdict is not None:
+                self._verdicts.move_to_end(key)
+                return verdict
+            if self._table_rows is None:
+                self._table_rows = self._count_rows(conn)
+            table_rows = self._table_rows
+
+        tokens = tokenize(sql)
+        if unbounded_recursion(tokens):
+            verdict = PlanVerdict(math.inf, ["recursive CTE without a stop condition"])
+        else:
+            with authorizer_errors():
+                plan = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+            verdict = _Estimate(plan, table_rows, aliases(tokens), exists_sources(tokens)).verdict()
+
+        with self._lock:
+            self._verdicts[key] = verdict
+            if len(self._verdicts) > self.cache_size:
+                self._verdicts.popitem(last=False)
+        return verdict
+
+    def check(self, conn, sql, max_cost):
+        """Raise BudgetExceeded("cost") if the plan of `sql` is estimated over `max_cost`."""
+        verdict = self.verdict(conn, sql)
+        if verdict.cost > max_cost:
+            raise BudgetExceeded("cost", f"Query plan is too expensive ({verdict.describe()})")
+        return verdict
+
+
+class _Estimate:
+    """One walk over an EXPLAIN QUERY PLAN result."""
+
+    def __init__(self, plan, table_rows, aliases, exists_sources=()):
+        self.children = {}
+        for node_id, parent, _, detail in plan:
+            self.children.setdefault(parent, []).append((node_id, detail))
+        self.table_rows = table_rows
+        self.aliases = aliases
+        self.exists_sources = exists_sources
+        self.subquery_rows = {}  # CTE / subquery name -> estimated rows
+        self.index_builds = 0.0  # rows read to build automatic indexes
+        self.problems = []
+
+    def verdict(self):
+        cost, _ = self.loops(0)
+        return PlanVerdict(cost + self.index_builds, self.problems)
+
+    def source(self, name):
+        """(table name or None, row count) of a name used in the plan."""
+        name = name.lower()
+        name = self.aliases.get(name, name)
+        if name in self.table_rows:
+            return name, self.table_rows[name]
+        return None, self.subquery_rows.get(name, 1)
+
+    def loops(self, parent, outer_rows=1):
+        """(rows read, rows produced) by the nested loops under `parent`.
+
+        `outer_rows` is how many times the caller runs them (for correlated
+        subqueries), only used to name the problem.
+        """
+        cost = 0.0
+        rows = 1.0
+        for node_id, detail in self.children.get(parent, ()):
+            words = detail.split()
+            if words[0] in ("SCAN", "SEARCH"):
+                name = words[2] if words[1] == "TABLE" else words[1]
+                read, produced = self.access(words[0], name, detail, outer_rows * rows)
+                cost += rows * read
+                rows *= produced
+            elif words[0] == "CORRELATED":
+                sub_cost = self.loops(node_id, outer_rows * rows)[0]
+                if self.is_exists(node_id):
+                    sub_cost = min(sub_cost, math.log2(sub_cost + 1) + 1)
+                cost += rows * sub_cost
+            elif words[0] in ("MATERIALIZE", "CO-ROUTINE"):
+                sub_cost, sub_rows = self.loops(node_id)
+                cost += sub_cost
+                self.subquery_rows[detail.split(" ", 1)[1].lower()] = sub_rows
+            elif words[0] == "COMPOUND":
+                parts = [self.loops(part_id) for part_id, _ in self.children.get(node_id, ())]
+                cost += sum(part_cost for part_cost, _ in parts)
+                rows *= sum(part_rows for _, part_rows in parts)
+            elif words[:2] == ["USE", "TEMP"]:
+                cost += rows * math.log2(rows + 1)  # sorting what the loops produced
+                if words[-2:] == ["GROUP", "BY"]:
+                    rows = math.sqrt(rows)
+            else:
+                # Subqueries run once, compound parts, recursive steps
+                cost += self.loops(node_id)[0]
+        return cost, rows
+
+    def is_exists(self, node_id):
+        # An EXISTS subquery: its first loop reads a table named in an EXISTS (...)
+        for _, detail in self.children.get(node_id, ()):
+            words = detail.split()
+            if words[0] in ("SCAN", "SEARCH"):
+                name = words[2] if words[1] == "TABLE" else words[1]
+                return name.lower() in self.exists_sources
+        return False
+
+    def access(self, kind, name, detail, outer_rows):
+        """(rows read per lookup, rows produced) of one SCAN/SEARCH step."""
+        if name == "CONSTANT":
+            return 1, 1
+        table, rows = self.source(name)
+        label = table or self.aliases.get(name.lower(), name)
+        if kind == "SCAN":
+            if outer_rows > 1 and rows > 1:
+                self.problems.append(f"full scan of {label} for each of ~{outer_rows:,.0f} rows")
+            elif table is not None and rows > LARGE_TABLE_ROWS:
+                self.problems.append(f"full scan of {table} ({rows:,} rows)")
+            return rows, rows
+        if "AUTOMATIC" in detail:
+            # SQLite builds a throwaway index for the join: one scan, then lookups
+            self.index_builds += rows
+            self.problems.append(f"no index on {label} for this join")
+        if "(rowid=?)" in detail:
+            produced = 1
+        elif "=" in detail:
+            produced = min(rows, SEARCH_EQUALITY_ROWS)
+        else:
+            produced = max(1, rows * SEARCH_RANGE_SHARE)
+        return math.log2(rows + 1) + produced, produced
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import threading
+
+import metrics
+
+
+def file_fingerprint(path):
+    """Cheap (mtime, size) stamp used to notice that a database file changed."""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def file_digest(path):
+    """Content hash of a database file, only computed when its stamp moved."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ReferenceCache:
+    """Normalized results of the reference queries, computed once per question.
+
+    The cache is tied to the database file: when its mtime/size changes the
+    file is re-hashed, and only a real content change drops the cached results.
+    Reference queries run outside the cache's lock, so a slow one only holds
+    up the requests waiting for that same question.
+    """
+
+    def __init__(self, db_path, queries, run_query):
+        self.db_path = db_path
+        self.queries = queries
+        self.run_query = run_query  # (sql) -> normalized result
+        self._results = {}
+        self._bytes = 0        # size_bytes of the cached results, kept up to date as they change
+        self._computing = {}   # question_id -> lock held while its result is computed
+        self._stamp = None
+        self._digest = None
+        self._lock = threading.Lock()
+
+    def _check_database(self):
+        stamp = file_fingerprint(self.db_path)
+        if stamp == self._stamp:
+            return
+        digest = file_digest(self.db_path)
+        if digest != self._digest:
+            self._results.clear()
+            self._bytes = 0
+            self._digest = digest
+        self._stamp = stamp
+
+    def get(self, question_id):
+        """Return the cached reference result, or None for an unknown question."""
+        query = self.queries.get(question_id)
+        if not query:
+            return None
+        with self._lock:
+            self._check_database()
+            result = self._results.get(question_id)
+            computing = self._computing.setdefault(question_id, threading.Lock())
+        if result is None:
+            with computing:
+                result = self._compute(question_id, query)
+        else:
+            metrics.REGISTRY.inc("reference_cache_lookups_total", result="hit")
+        return result
+
+    def _compute(self, question_id, query):
+        # Another request may have computed it while this one waited for `computing`
+        with self._lock:
+            self._check_database()
+            result = self._results.get(question_id)
+            digest = self._digest
+        if result is not None:
+            metrics.REGISTRY.inc("reference_cache_lookups_total", result="hit")
+            return result
+        metrics.REGISTRY.inc("reference_cache_lookups_total", result="miss")
+        with metrics.stage("reference_query"):
+            result = self.run_query(query)
+        with self._lock:
+            # A result of a database that changed while the query ran isn't kept
+            if self._digest == digest and question_id not in self._results:
+                self._results[question_id] = result
+                self._bytes += result.size_bytes
+        return result
+
+    def memory_bytes(self):
+        """Approximate size of the cached results (read without waiting for the lock)."""
+        return self._bytes
+
+    def warm(self):
+        """Compute every reference result up front (e.g. at server startup)."""
+        for question_id in self.queries:
+            self.get(question_id)
+
+    @property
+    def version(self):
+        """Content hash of the database the cached results were computed from."""
+        with self._lock:
+            self._check_database()
+            return self._digest
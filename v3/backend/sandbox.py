@@ -0,0 +1,275 @@
+import marshal
+import math
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import sqlite3
+import threading
+
+import metrics
+from budget import BudgetExceeded
+from grader import Grader
+from validator import QueryRejected
+
+# Address space one sandbox worker may use (Python, SQLite and the result rows)
+MEMORY_LIMIT_BYTES = 512 * 1024 * 1024
+# Share of it given to SQLite's own heap limit, so most runaway queries fail
+# cleanly with "out of memory" before the kernel limit is reached
+SQLITE_HEAP_SHARE = 0.5
+# How long the server waits past the budget's timeout before killing a worker
+KILL_GRACE_SECONDS = 2.0
+# How long a new worker may take to import and open the database
+STARTUP_TIMEOUT_SECONDS = 30.0
+# Workers are replaced after this many queries, so leaks can't pile up
+MAX_JOBS_PER_WORKER = 500
+
+
+class QueryFailed(Exception):
+    """The query failed inside the sandbox (SQL error, crashed or unavailable worker)."""
+
+
+def cpu_seconds_for(budget):
+    """CPU time allowed per query: the wall-clock budget plus one second."""
+    return math.ceil(budget.timeout) + 1
+
+
+def apply_memory_limit(memory_limit):
+    """Cap the calling process' address space (RLIMIT_AS)."""
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def limit_cpu(seconds):
+    """Let the calling process use at most `seconds` more CPU time; SIGXCPU kills it after."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime) + seconds
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+# --- runs inside the sandbox worker processes ---
+
+def _send(channel, message):
+    # False once the server has closed its end of the pipe (retired us or is shutting down)
+    try:
+        channel.send_bytes(marshal.dumps(message))
+        return True
+    except OSError:
+        return False
+
+
+def _worker_main(channel, grader_args, memory_limit, cpu_seconds):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is for the server, which stops us
+    try:
+        apply_memory_limit(memory_limit)
+        grader = Grader.from_worker_args(*grader_args)
+        # The heap limit is process-wide, so it is set from a scratch connection
+        # (the pool's ones refuse PRAGMAs)
+        scratch = sqlite3.connect(":memory:")
+        scratch.execute(f"PRAGMA hard_heap_limit = {int(memory_limit * SQLITE_HEAP_SHARE)}")
+        scratch.close()
+        # Reference results are computed before the first query arrives
+        grader.reference_cache.warm()
+    except Exception as e:
+        _send(channel, ("error", f"Query worker failed to start: {e}"))
+        return
+    if not _send(channel, ("ready",)):
+        return
+
+    handlers = {"grade": grader.grade_on, "check": grader.check_on, "page": grader.page_on}
+    while True:
+        try:
+            op, args = marshal.loads(channel.recv_bytes())
+        except (EOFError, OSError):
+            return  # the server closed our pipe: retired or shutting down
+        limit_cpu(cpu_seconds)
+        # Stage timings are sent back with the reply and recorded by the server
+        with metrics.REGISTRY.capture() as observations:
+            try:
+                with grader.user_pool.connection() as conn:
+                    reply = ("ok", handlers[op](conn, *args))
+            except QueryRejected as e:
+                reply = ("rejected", str(e))
+            except BudgetExceeded as e:
+                reply = ("budget", e.limit, str(e))
+            except MemoryError:
+                # Report it, then exit so the replacement starts with a clean heap
+                reply = ("budget", "memory", "Query exceeded the memory limit")
+                _send(channel, (observations, reply))
+                return
+            except Exception as e:
+                reply = ("error", str(e))
+        if not _send(channel, (observations, reply)):
+            return
+
+
+# --- runs in the web server process ---
+
+class _Worker:
+    """One sandbox process and the server's end of its pipe."""
+
+    def __init__(self, context, args):
+        self.channel, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,) + args,
+                                       name="query-sandbox", daemon=True)
+        self.process.start()
+        child.close()
+        self.ready = False
+        self.jobs = 0
+
+    def _wait_ready(self):
+        if not self.channel.poll(STARTUP_TIMEOUT_SECONDS):
+            raise QueryFailed("Query worker did not start in time")
+        reply = marshal.loads(self.channel.recv_bytes())
+        if reply[0] != "ready":
+            raise QueryFailed(reply[1])
+        self.ready = True
+
+    def call(self, message, timeout):
+        """Send one request; returns the decoded reply, or None if it took longer than `timeout`."""
+        if not self.ready:
+            self._wait_ready()
+        self.jobs += 1
+        self.channel.send_bytes(message)
+        if not self.channel.poll(timeout):
+            return None
+        observations, reply = marshal.loads(self.channel.recv_bytes())
+        metrics.REGISTRY.replay(observations)
+        return reply
+
+    def exit_signal(self):
+        """Signal number that killed the process, or None if it is alive or exited normally."""
+        self.process.join(1.0)
+        code = self.process.exitcode
+        return -code if code is not None and code < 0 else None
+
+    def stop(self, kill=False):
+        self.channel.close()
+        if not kill:
+            self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class QuerySandbox:
+    """Runs contestant SQL in a pool of pre-started worker processes.
+
+    Offers the grade(), check() and stream_page() calls of Grader, but each one runs
+    in a worker that keeps the dataset open read-only and its reference
+    results warm, under RLIMIT_AS and a per-query RLIMIT_CPU. A query that
+    crashes, exhausts memory or hangs only costs its worker, which is killed
+    and replaced. Requests and results cross the pipe marshal-encoded.
+    """
+
+    def __init__(self, grader, workers=None, memory_limit=MEMORY_LIMIT_BYTES, cpu_seconds=None,
+                 max_jobs=MAX_JOBS_PER_WORKER):
+        self.budget = grader.budget
+        self.user_db_path = grader.user_db_path
+        self.workers = workers or os.cpu_count() or 1
+        self.max_jobs = max_jobs
+        self.timeout = self.budget.timeout + KILL_GRACE_SECONDS
+        self._args = (grader.worker_args(), memory_limit, cpu_seconds or cpu_seconds_for(self.budget))
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+
+    def start(self):
+        """Start every worker now (otherwise done by the first query)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for _ in range(self.workers):
+                self._idle.put(_Worker(self._context, self._args))
+
+    def grade(self, question_id, user_query):
+        return self._call("grade", question_id, user_query)
+
+    def check(self, question, user_query):
+        return self._call("check", dict(question), user_query)
+
+    def stream_page(self, user_query, offset, limit):
+        # The worker sends the whole page (at most pagination.MAX_PAGE_ROWS rows) at once
+        columns, rows, more = self._call("page", user_query, offset, limit)
+        yield "columns", columns
+        yield "rows", rows
+        yield "end", more
+
+    def _call(self, op, *args):
+        self.start()
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise QueryFailed("All query workers are busy, please try again") from None
+        healthy = False
+        try:
+            try:
+                reply = worker.call(marshal.dumps((op, args)), self.timeout)
+            except (EOFError, OSError):
+                raise self._crash_error(worker) from None
+            if reply is None:
+                raise BudgetExceeded("timeout", f"Query exceeded the {self.budget.timeout:g}s time limit")
+            # A worker that ran out of memory exits after answering
+            healthy = reply[:2] != ("budget", "memory")
+        finally:
+            self._release(worker, healthy)
+
+        status = reply[0]
+        if status == "ok":
+            return reply[1]
+        if status == "rejected":
+            raise QueryRejected(reply[1])
+        if status == "budget":
+            raise BudgetExceeded(reply[1], reply[2])
+        raise QueryFailed(reply[1])
+
+    def _crash_error(self, worker):
+        if worker.exit_signal() == signal.SIGXCPU:
+            return BudgetExceeded("cpu", "Query exceeded the CPU time limit")
+        return QueryFailed("Query crashed its worker process")
+
+    def _release(self, worker, healthy):
+        if self._closed:
+            worker.stop(kill=not healthy)
+            return
+        if healthy and worker.jobs < self.max_jobs:
+            self._idle.put(worker)
+            return
+        # A worker that isn't healthy may still be stuck in its query
+        worker.stop(kill=not healthy)
+        self._idle.put(_Worker(self._context, self._args))
+
+    def warm(self):
+        # Workers warm their reference results as they start
+        self.start()
+
+    def memory_bytes(self):
+        """Rough memory of the workers: one copy of the dataset each (if started)."""
+        if not self._started:
+            return 0
+        return self.workers * os.path.getsize(self.user_db_path)
+
+    def close(self):
+        self.shutdown()
+
+    def shutdown(self):
+        """Stop the idle workers; busy ones stop when their query returns."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+def query_executor(grader, workers=0, **limits):
+    """A QuerySandbox with `workers` processes, or `grader` itself (in-process) when 0."""
+    if workers > 0:
+        return QuerySandbox(grader, workers, **limits)
+    return grader
@@ -0,0 +1,134 @@
+import bisect
+import threading
+import time
+
+SCOREBOARD_TABLE = '''
+CREATE TABLE IF NOT EXISTS scoreboard (
+    user_id TEXT PRIMARY KEY,
+    score INTEGER NOT NULL DEFAULT 0,
+    reached_at REAL NOT NULL,             -- when the current score was reached (tie-break)
+    finished INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0    -- bumped on every change, see Scoreboard.sync
+)
+'''
+
+_NEXT_VERSION = "(SELECT COALESCE(MAX(version), 0) + 1 FROM scoreboard)"
+
+
+def scoreboard_backfill(score_column):
+    """Statements that create the scoreboard table from existing submissions."""
+    return [
+        SCOREBOARD_TABLE,
+        "CREATE INDEX IF NOT EXISTS idx_scoreboard_version ON scoreboard (version)",
+        f'''INSERT OR IGNORE INTO scoreboard (user_id, score, reached_at, finished, version)
+            SELECT user_id, SUM({score_column}), CAST(strftime('%s', 'now') AS REAL),
+                   EXISTS (SELECT 1 FROM final_scores f WHERE f.user_id = s.user_id), 1
+            FROM submissions s GROUP BY user_id''',
+    ]
+
+
+def refresh_scores(cursor, user_ids, score_column="is_correct"):
+    """Recompute the scoreboard rows of `user_ids` from their submissions.
+
+    Call it in the same transaction as the submission INSERTs. Each sum reads
+    the (user_id, score) covering index, so it costs one index range per user.
+    """
+    now = time.time()
+    cursor.executemany(f'''
+        INSERT INTO scoreboard (user_id, score, reached_at, version)
+        SELECT ?, COALESCE(SUM({score_column}), 0), ?, {_NEXT_VERSION} FROM submissions WHERE user_id = ?
+        ON CONFLICT(user_id) DO UPDATE SET
+            score = excluded.score, reached_at = excluded.reached_at, version = excluded.version
+        WHERE excluded.score != scoreboard.score
+    ''', [(user_id, now, user_id) for user_id in set(user_ids)])
+
+
+def store_submissions(cursor, rows, score_column="is_correct"):
+    """Insert (user_id, question_id, user_query, score) rows and refresh their users' scores.
+
+    A (user, question) pair that already has a submission keeps its first
+    answer; returns whether each row was stored.
+    """
+    stored = []
+    for row in rows:
+        # Only the duplicate is skipped; other constraint errors (a NULL user_id) still raise
+        cursor.execute(
+            f"INSERT INTO submissions (user_id, question_id, user_query, {score_column}) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(user_id, question_id) DO NOTHING",
+            row)
+        stored.append(cursor.rowcount == 1)
+    refresh_scores(cursor, [row[0] for row, ok in zip(rows, stored) if ok], score_column)
+    return stored
+
+
+def store_submission_groups(cursor, groups, score_column="is_correct"):
+    """store_submissions() for GroupCommitWriter records that are lists of rows.
+
+    A group (e.g. all of one /submit_batch request) is then written in a single
+    transaction, all or nothing; returns each group's list of results.
+    """
+    stored = store_submissions(cursor, [row for group in groups for row in group], score_column)
+    results = []
+    for group in groups:
+        results.append(stored[:len(group)])
+        stored = stored[len(group):]
+    return results
+
+
+def mark_finished(cursor, user_id):
+    """Flag a user as finished, returning their score."""
+    cursor.execute(f'''
+        INSERT INTO scoreboard (user_id, score, reached_at, finished, version)
+        VALUES (?, 0, ?, 1, {_NEXT_VERSION})
+        ON CONFLICT(user_id) DO UPDATE SET finished = 1, version = excluded.version
+    ''', (user_id, time.time()))
+    cursor.execute("SELECT score FROM scoreboard WHERE user_id = ?", (user_id,))
+    return cursor.fetchone()[0]
+
+
+class Scoreboard:
+    """In-memory ranking of the scoreboard table (highest score, then earliest to reach it).
+
+    sync() pulls only the rows whose version moved since the last call, so it
+    stays cheap and keeps every worker process in step with the table.
+    Syncs may run at the same time (the broadcaster and /winners), so a row
+    read by one can arrive after a newer one applied by the other; each
+    entry keeps its version and older rows are skipped.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._entries = {}   # user_id -> (ranking key, finished, version)
+        self._ranking = []   # sorted (-score, reached_at, user_id)
+        self._lock = threading.Lock()
+
+    def sync(self, conn):
+        """Apply scoreboard rows changed since the last sync; returns True if any were."""
+        rows = conn.execute(
+            "SELECT user_id, score, reached_at, finished, version FROM scoreboard "
+            "WHERE version > ? ORDER BY version", (self.version,)).fetchall()
+        if not rows:
+            return False
+        with self._lock:
+            for user_id, score, reached_at, finished, version in rows:
+                self._apply(user_id, score, reached_at, bool(finished), version)
+                self.version = max(self.version, version)
+        return True
+
+    def _apply(self, user_id, score, reached_at, finished, version):
+        old = self._entries.get(user_id)
+        if old is not None:
+            if old[2] >= version:
+                return
+            index = bisect.bisect_left(self._ranking, old[0])
+            del self._ranking[index]
+        key = (-score, reached_at, user_id)
+        bisect.insort(self._ranking, key)
+        self._entries[user_id] = (key, finished, version)
+
+    def top(self, k):
+        with self._lock:
+            return [
+                {"user_id": user_id, "score": -neg_score, "finished": self._entries[user_id][1]}
+                for neg_score, _, user_id in self._ranking[:k]
+            ]
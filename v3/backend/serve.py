@@ -0,0 +1,75 @@
+import atexit
+import os
+import signal
+import threading
+
+from gunicorn.app.base import BaseApplication
+
+# Production server for the contest backend (test3.py): gunicorn forks WEB_WORKERS
+# processes, each answering WEB_THREADS requests at a time. Run from this directory:
+#
+#     WEB_WORKERS=8 python serve.py
+#
+# Each worker imports test3 itself, so it has its own connection pools, caches,
+# group-commit writers and sandbox/grader processes (SANDBOX_WORKERS and
+# GRADING_WORKERS are per web worker, as is DATASET_MEMORY_LIMIT). The workers
+# share the admin databases, which are WAL and tolerate concurrent writers, and
+# /metrics reports on the worker that answered it.
+
+BIND = os.environ.get("BIND", "0.0.0.0:5000")
+# Processes: contestant queries hold the GIL, so one per core is what scales
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", os.cpu_count() or 1))
+# Threads per process, for requests that wait (on a group commit, a sandbox
+# worker, a client); each open /winners/stream holds one
+WEB_THREADS = int(os.environ.get("WEB_THREADS", "8"))
+# Seconds a stopping worker lets its requests finish before it is killed
+GRACEFUL_TIMEOUT = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+
+
+def create_app():
+    """The backend's WSGI app, for any server (`gunicorn 'serve:create_app()'` too).
+
+    Contests are opened on their first request in the importing process, and
+    closed at its exit, which writes the submissions and verdicts still queued.
+    """
+    import test3
+    atexit.register(test3.shutdown)
+    return test3.app
+
+
+def post_worker_init(worker):
+    import test3
+    test3.warm_up()
+
+    # On SIGTERM gunicorn stops accepting connections and waits for the open
+    # requests; end the leaderboard streams, which would otherwise never finish
+    graceful_exit = worker.handle_exit
+
+    def handle_exit(sig, frame):
+        threading.Thread(target=test3.end_streams, daemon=True).start()
+        graceful_exit(sig, frame)
+    signal.signal(signal.SIGTERM, handle_exit)
+
+
+class ContestServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for name, value in self.options.items():
+            self.cfg.set(name, value)
+
+    def load(self):
+        return create_app()
+
+
+if __name__ == '__main__':
+    ContestServer({
+        "bind": BIND,
+        "workers": WEB_WORKERS,
+        "worker_class": "gthread",
+        "threads": WEB_THREADS,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "post_worker_init": post_worker_init,
+    }).run()
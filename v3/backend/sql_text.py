@@ -0,0 +1,109 @@
+import re
+from functools import lru_cache
+
+# One alternative per SQLite token class; whitespace and comments are dropped.
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+|--[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<string>'(?:[^']|'')*'?)
+  | (?P<quoted>"(?:[^"]|"")*"?|`(?:[^`]|``)*`?|\[[^\]]*\]?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)
+  | (?P<param>[?:@$][A-Za-z0-9_]*)
+  | (?P<op>\|\||<<|>>|<=|>=|==|!=|<>|.)
+""", re.S | re.X)
+
+
+def _scan(sql):
+    """(kind, text, start, end) of each token, skipping whitespace and comments."""
+    return [
+        (match.lastgroup, match.group(), match.start(), match.end())
+        for match in _TOKEN_RE.finditer(sql)
+        if match.lastgroup != "space"
+    ]
+
+
+def tokenize(sql):
+    """Split SQL text into (kind, text) tokens, skipping whitespace and comments."""
+    return [(kind, text) for kind, text, _, _ in _scan(sql)]
+
+
+def has_top_level_order_by(sql):
+    """True if the statement itself (not a subquery or window) is ORDER BY'd."""
+    depth = 0
+    previous = None
+    for kind, text in tokenize(sql):
+        if kind == "op":
+            if text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+        elif kind == "word" and depth == 0:
+            word = text.upper()
+            if word == "BY" and previous == "ORDER":
+                return True
+            previous = word
+            continue
+        previous = None
+    return False
+
+
+# Keywords whose case is folded by normalize_sql. Other words (table and
+# column names) keep their case because it shows up in result column labels.
+KEYWORDS = {
+    "ALL", "AND", "AS", "ASC", "BETWEEN", "BY", "CASE", "CAST", "COLLATE",
+    "CROSS", "DESC", "DISTINCT", "ELSE", "END", "ESCAPE", "EXCEPT", "EXISTS",
+    "FROM", "FULL", "GLOB", "GROUP", "HAVING", "IN", "INNER", "INTERSECT",
+    "IS", "ISNULL", "JOIN", "LEFT", "LIKE", "LIMIT", "NATURAL", "NOT",
+    "NOTNULL", "NULL", "NULLS", "OFFSET", "ON", "OR", "ORDER", "OUTER",
+    "OVER", "PARTITION", "RECURSIVE", "REGEXP", "RIGHT", "SELECT", "THEN",
+    "UNION", "USING", "VALUES", "WHEN", "WHERE", "WINDOW", "WITH",
+}
+
+
+# Words that end the result-column list of a SELECT (at its own nesting depth)
+_SELECT_LIST_END = {
+    "FROM", "WHERE", "GROUP", "HAVING", "WINDOW", "ORDER", "LIMIT", "UNION", "INTERSECT", "EXCEPT",
+}
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql):
+    """Canonical text of a query: single spaces, upper-case keywords, no comments
+    and no trailing semicolons. Literals and identifiers are left untouched.
+
+    Result-column lists (between SELECT and FROM) are kept exactly as written,
+    because SQLite names an unaliased result column after the text of its
+    expression: `COUNT( * )` and `COUNT(*)` give different column names, so
+    they must not share a cache entry or a verdict.
+
+    Memoized on the exact text, so cache keys of resubmitted queries cost one lookup."""
+    tokens = _scan(sql)
+    parts = []
+    i = 0
+    while i < len(tokens):
+        kind, text, _, end = tokens[i]
+        i += 1
+        if kind == "word" and text.upper() in KEYWORDS:
+            text = text.upper()
+        parts.append(text)
+        if text != "SELECT":
+            continue
+        depth = 0
+        j = i
+        while j < len(tokens):
+            kind, word, _, _ = tokens[j]
+            if word == "(":
+                depth += 1
+            elif word == ")":
+                if depth == 0:
+                    break
+                depth -= 1
+            elif depth == 0 and (word == ";" or kind == "word" and word.upper() in _SELECT_LIST_END):
+                break
+            j += 1
+        if j > i:
+            parts.append(sql[end:tokens[j - 1][3]].strip())
+            i = j
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
@@ -1,22 +1,34 @@
-from flask import Flask, request, jsonify
-import sqlite3
-import json  
+from flask import Flask, Response, g, request, jsonify
+import os
+import time
+from contextlib import contextmanager
+import metrics
+from budget import BudgetExceeded, ExecutionBudget
+from contests import DATASET_MEMORY_LIMIT_BYTES, Contest, ContestAdmin, ContestRegistry, load_contests
+from db_pool import ConnectionPool
+from grader import Grader
+from grader_queue import GradingQueue
+from group_commit import MAX_BATCH_RECORDS, MAX_DELAY_SECONDS, GroupCommitWriter
+from leaderboard_stream import LeaderboardBroadcaster
+from migrations import CONTEST_MIGRATIONS, run_migrations
+from pagination import columnar_json, decode_cursor, encode_cursor, page_size, started
+from result_cache import ResultCache, database_version
+from sandbox import query_executor
+from scoreboard import Scoreboard, mark_finished, store_submission_groups, store_submissions
+from sql_text import normalize_sql
+from validator import QueryRejected, validate_query
+from verdict_cache import VerdictCache
 
 app = Flask(__name__)
 
-# Database paths
+# Database paths (of the default contest)
 ADMIN_DB_PATH = "contest.db"      
 USER_DB_PATH = "bookstore.db"      
 
-def get_admin_db_connection():
-    conn = sqlite3.connect(ADMIN_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Contest of requests that don't name one with `contest_id`
+DEFAULT_CONTEST = "bookstore"
 
-def get_user_db_connection():
-    conn = sqlite3.connect(USER_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+MAX_WINNERS = 100
 
 # Predefined correct queries (for `bookstore` schema)
 CORRECT_ANSWERS = {
@@ -32,69 +44,416 @@ CORRECT_ANSWERS = {
     10: "SELECT COUNT(DISTINCT genre) FROM books;"  # Number of unique genres
 }
 
+# Time/size limits for contestant queries
+query_budget = ExecutionBudget(timeout=5.0, max_vm_steps=50_000_000, max_rows=10_000,
+                               max_plan_cost=100_000_000)
+
+# Run contestant queries on in-memory copies of the datasets (they don't change during a
+# contest); set USER_DB_IN_MEMORY=0 to read the files instead, e.g. for large datasets.
+# A contest's copies share db_pool.IN_MEMORY_MAX_BYTES; queries past it read the file.
+USER_DB_IN_MEMORY = os.environ.get("USER_DB_IN_MEMORY", "1") != "0"
+
+# Processes that run contestant SQL under memory/CPU limits; with 0 it runs in this process
+SANDBOX_WORKERS = int(os.environ.get("SANDBOX_WORKERS", "0"))
+
+# Recent /view_output pages, keyed by (contest, database version, normalized query, offset, page size)
+output_cache = ResultCache(max_bytes=64 * 1024 * 1024, ttl=60.0)
+
+# Most submissions accepted by one /submit_batch request
+MAX_BATCH_SIZE = 1000
+
+# Durability of the admin databases: WAL journal (ADMIN_DB_WAL=0 for a rollback
+# journal) and PRAGMA synchronous (NORMAL: commits survive a crash of the server,
+# FULL: also a power loss)
+ADMIN_DB_WAL = os.environ.get("ADMIN_DB_WAL", "1") != "0"
+ADMIN_DB_SYNCHRONOUS = os.environ.get("ADMIN_DB_SYNCHRONOUS", "NORMAL")
+
+# Graded submissions are committed together, every COMMIT_DELAY_MS or COMMIT_BATCH_SIZE records
+COMMIT_DELAY_MS = float(os.environ.get("COMMIT_DELAY_MS", MAX_DELAY_SECONDS * 1000))
+COMMIT_BATCH_SIZE = int(os.environ.get("COMMIT_BATCH_SIZE", MAX_BATCH_RECORDS))
+
+# Grader processes for queued submissions; with 0, /submit_query grades inside the request
+GRADING_WORKERS = int(os.environ.get("GRADING_WORKERS", "0"))
+
+def contest_grader(contest):
+    # Reference results are computed once per version of the dataset file
+    return Grader(contest.dataset_path, contest.answers, query_budget, in_memory=USER_DB_IN_MEMORY)
+
+def open_dataset(contest):
+    return query_executor(contest_grader(contest), SANDBOX_WORKERS)
+
+def open_admin(contest):
+    # Pooled admin connections in WAL mode; tables and indexes are brought up
+    # to date on first use (versioned, safe to run on every start)
+    pool = ConnectionPool(contest.admin_db_path, wal=ADMIN_DB_WAL, busy_timeout_ms=5000,
+                          synchronous=ADMIN_DB_SYNCHRONOUS)
+    with pool.connection() as conn:
+        run_migrations(conn, "contest", CONTEST_MIGRATIONS)
+
+    # In-memory ranking of the `scoreboard` table, used by /winners; the
+    # broadcaster pushes top-10 changes to /winners/stream subscribers
+    scoreboard = Scoreboard()
+    leaderboard = LeaderboardBroadcaster(scoreboard, pool.connection, top_k=10)
+
+    # Submissions graded in requests are written by one thread, many per transaction;
+    # a record is the list of rows of one request, which always share a transaction
+    writer = GroupCommitWriter(pool.connection, store_submission_groups, max_batch=COMMIT_BATCH_SIZE,
+                               max_delay=COMMIT_DELAY_MS / 1000, on_flushed=leaderboard.notify)
+
+    # Results of query texts already graded for a question, kept across restarts
+    verdicts = VerdictCache(pool.connection, contest.dataset_path, contest.answers)
+
+    def store_graded(cursor, job, is_correct):
+        stored, = store_submissions(cursor, [(job["user_id"], job["question_id"], job["user_query"], is_correct)])
+        verdicts.put(job["question_id"], job["user_query"], is_correct)
+        return stored
+
+    grading_queue = None
+    if GRADING_WORKERS > 0:
+        grading_queue = GradingQueue(pool.connection, contest_grader(contest), GRADING_WORKERS,
+                                     store_result=store_graded, on_stored=leaderboard.notify)
+        # Jobs queued before a restart are graded without waiting for a new submission
+        grading_queue.start()
+    return ContestAdmin(pool, scoreboard, leaderboard, writer, verdicts, grading_queue)
+
+def graded_before(admin, question_id, user_query):
+    # Verdict of the same query text already graded for this question, or None
+    with metrics.stage("verdict_lookup"):
+        return admin.verdicts.get(question_id, user_query)
+
+def grade(contest, admin, question_id, user_query):
+    # Run the query on the contest's dataset and remember the verdict for its text
+    with contests.dataset(contest.contest_id) as dataset, contestant_query("grade", contest, user_query):
+        is_correct = dataset.grade(question_id, user_query)
+    admin.verdicts.put(question_id, user_query, is_correct)
+    return is_correct
+
+# Contests are opened on their first request; datasets not used lately are closed
+# when the loaded ones take more than DATASET_MEMORY_LIMIT bytes
+contests = ContestRegistry(
+    open_dataset, open_admin,
+    memory_limit=int(os.environ.get("DATASET_MEMORY_LIMIT", DATASET_MEMORY_LIMIT_BYTES)))
+contests.register(Contest(DEFAULT_CONTEST, USER_DB_PATH, CORRECT_ANSWERS, ADMIN_DB_PATH))
+
+# More contests, each with its own dataset, questions and admin database (see contests.load_contests)
+if os.environ.get("CONTESTS_FILE"):
+    for contest in load_contests(os.environ["CONTESTS_FILE"]):
+        contests.register(contest)
+
+def warm_up():
+    # Open every contest now instead of on its first request (serve.py runs it in each worker)
+    for contest_id in contests.stats()["contests"]:
+        contests.admin(contest_id)
+        with contests.dataset(contest_id) as dataset:
+            dataset.warm()
+
+def end_streams():
+    # Let /winners/stream clients go, so they don't hold up a graceful shutdown
+    for admin in contests.open_admins().values():
+        admin.leaderboard.close()
+
+def shutdown():
+    # Write the pending submissions and verdicts and close the databases
+    contests.close()
+
+# Contestant queries slower than this many seconds are logged with their SQL (unset: off)
+SLOW_QUERY_SECONDS = float(os.environ["SLOW_QUERY_SECONDS"]) if os.environ.get("SLOW_QUERY_SECONDS") else None
+
+@contextmanager
+def contestant_query(stage, contest, user_query):
+    # Times running a contestant query as `stage` and logs it if it is slow
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.REGISTRY.observe("stage_seconds", elapsed, stage=stage)
+        if SLOW_QUERY_SECONDS is not None and elapsed >= SLOW_QUERY_SECONDS:
+            metrics.REGISTRY.inc("slow_queries_total", stage=stage)
+            app.logger.warning("Slow query (%.3fs, contest %s, %s): %s",
+                               elapsed, contest.contest_id, stage, user_query)
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # Streamed responses (/winners/stream) are timed until their headers are sent
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.REGISTRY.observe("request_seconds", time.perf_counter() - g.request_start,
+                             endpoint=endpoint, status=response.status_code)
+    return response
+
+def cache_metrics():
+    stats = output_cache.stats()
+    datasets = contests.stats()
+    return [
+        ("output_cache_lookups_total", "counter", "/view_output cache lookups, by hit or miss.",
+         [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]),
+        ("output_cache_hit_rate", "gauge", "Share of /view_output cache lookups that hit.",
+         [({}, stats["hit_rate"])]),
+        ("output_cache_evictions_total", "counter", "/view_output responses evicted from the cache.",
+         [({}, stats["evictions"])]),
+        ("output_cache_bytes", "gauge", "Size of the cached /view_output responses.",
+         [({}, stats["bytes"])]),
+        ("datasets_loaded", "gauge", "Contest datasets currently open.",
+         [({}, len(datasets["loaded"]))]),
+        ("datasets_memory_bytes", "gauge", "Memory used by the open contest datasets.",
+         [({}, datasets["memory_bytes"])]),
+        ("dataset_evictions_total", "counter", "Contest datasets closed to free memory.",
+         [({}, datasets["evictions"])]),
+    ]
+
+def verdict_metrics():
+    samples = {contest_id: admin.verdicts.stats() for contest_id, admin in contests.open_admins().items()}
+    return [
+        ("verdict_cache_lookups_total", "counter", "Lookups of already graded query texts, by hit or miss.",
+         [({"contest": contest_id, "result": result}, stats[total])
+          for contest_id, stats in samples.items() for result, total in (("hit", "hits"), ("miss", "misses"))]),
+        ("verdict_cache_hit_rate", "gauge", "Share of graded submissions answered from the verdict cache.",
+         [({"contest": contest_id}, stats["hit_rate"]) for contest_id, stats in samples.items()]),
+    ]
+
+metrics.REGISTRY.collector(cache_metrics)
+metrics.REGISTRY.collector(verdict_metrics)
+
+def requested_contest(params):
+    # `contest_id` from the JSON body or query string; None if there is no such contest
+    return contests.get(params.get('contest_id', DEFAULT_CONTEST))
+
+def unknown_contest():
+    return jsonify({"error": "Unknown contest"}), 404
+
+def answered_questions(admin_cursor, user_ids):
+    # (user_id, question_id) pairs that already have a submission
+    answered = set()
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), 500):
+        chunk = user_ids[start:start + 500]
+        placeholders = ", ".join("?" * len(chunk))
+        admin_cursor.execute(
+            f"SELECT user_id, question_id FROM submissions WHERE user_id IN ({placeholders})", chunk)
+        answered.update((row["user_id"], row["question_id"]) for row in admin_cursor.fetchall())
+    return answered
+
+def already_submitted(admin, user_id, question_id):
+    with metrics.stage("duplicate_check"), admin.connection() as admin_conn:
+        admin_cursor = admin_conn.cursor()
+        admin_cursor.execute("SELECT * FROM submissions WHERE user_id = ? AND question_id = ?", 
+                             (user_id, question_id))
+        return admin_cursor.fetchone() is not None
+
+def finalize(admin, user_id):
+    # Store the user's final score and return it; None if it was finalized before
+    with admin.connection() as conn:
+        # Take the write lock before reading, so two /finish calls can't both see "not finished"
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+
+        # Check if user already has a final score
+        cursor.execute("SELECT * FROM final_scores WHERE user_id = ?", (user_id,))
+        if cursor.fetchone():
+            conn.rollback()
+            return None
+
+        # The scoreboard already holds the total, kept current by every submission
+        total_score = mark_finished(cursor, user_id)
+
+        # Store the final score in the final_scores table
+        cursor.execute("INSERT INTO final_scores (user_id, score) VALUES (?, ?)", (user_id, total_score))
+        conn.commit()
+    admin.leaderboard.notify()
+    return total_score
+
+def stream_page(contest, user_query, offset, limit):
+    # The dataset stays checked out until the last row of the page is sent
+    with contests.dataset(contest.contest_id) as dataset:
+        yield from dataset.stream_page(user_query, offset, limit)
+
+def top_scores(admin, limit):
+    with admin.connection() as conn:
+        admin.scoreboard.sync(conn)
+    return admin.scoreboard.top(limit)
+
 @app.route('/submit_query', methods=['POST'])
 def submit_query():
     data = request.json
     user_id = data.get('user_id')
     question_id = data.get('question_id')
     user_query = data.get('query', '')
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+    contest = requested_contest(data)
+    if contest is None:
+        return unknown_contest()
     
-    # Disallow modification queries
-    if any(word in user_query.upper() for word in ["DROP", "DELETE", "INSERT", "UPDATE"]):
-        return jsonify({"error": "Modifications are not allowed!"})
+    # Disallow modification queries (token check here, SQLite's authorizer while executing)
+    try:
+        with metrics.stage("validate"):
+            validate_query(user_query)
+    except QueryRejected as e:
+        return jsonify({"error": str(e)})
     
     try:
+        admin = contests.admin(contest.contest_id)
+
         # 1. Check if the user already submitted an answer for this question
-        admin_conn = get_admin_db_connection()
-        admin_cursor = admin_conn.cursor()
-        admin_cursor.execute("SELECT * FROM submissions WHERE user_id = ? AND question_id = ?", 
-                             (user_id, question_id))
-        existing_submission = admin_cursor.fetchone()
-        if existing_submission:
-            admin_conn.close()
+        if already_submitted(admin, user_id, question_id):
             return jsonify({"error": "You have already submitted an answer for this question."})
-        admin_conn.close()
-        
-        # 2. Execute user's query on `bookstore` database
-        user_conn = get_user_db_connection()
-        user_cursor = user_conn.cursor()
-        user_cursor.execute(user_query)
-        user_results = user_cursor.fetchall()
-        user_data = [dict(row) for row in user_results]
-        user_conn.close()
         
-        # 3. Execute the correct query on `bookstore` database
-        correct_query = CORRECT_ANSWERS.get(question_id)
-        if not correct_query:
+        # 2. Make sure there is a correct query for this question
+        if question_id not in contest.answers:
             return jsonify({"error": "Correct query not defined for this question."})
         
-        correct_conn = get_user_db_connection()  # Run correct query on the same `bookstore` DB
-        correct_cursor = correct_conn.cursor()
-        correct_cursor.execute(correct_query)
-        correct_results = correct_cursor.fetchall()
-        correct_data = [dict(row) for row in correct_results]
-        correct_conn.close()
+        # A query text graded before for this question is answered without running it
+        is_correct = graded_before(admin, question_id, user_query)
+
+        # Hand the answer to the grader workers; the client polls /submission/<id>
+        if is_correct is None and admin.grading_queue is not None:
+            with metrics.stage("enqueue"):
+                submission_id = admin.grading_queue.enqueue(user_id, question_id, user_query)
+            if submission_id is None:
+                return jsonify({"error": "You have already submitted an answer for this question."})
+            return jsonify({"message": "Answer queued for grading", "submission_id": submission_id,
+                            "status": "queued"}), 202
         
-        # 4. Compare results (ignoring row order)
-        sorted_user = sorted(user_data, key=lambda x: json.dumps(x, sort_keys=True))
-        sorted_correct = sorted(correct_data, key=lambda x: json.dumps(x, sort_keys=True))
-        is_correct = 1 if sorted_user == sorted_correct else 0
+        # 3./4. Execute user's query and compare it with the (cached) correct result
+        if is_correct is None:
+            is_correct = grade(contest, admin, question_id, user_query)
         
-        # 5. Store the submission in `admin_db.sqlite`
-        admin_conn = get_admin_db_connection()
-        admin_cursor = admin_conn.cursor()
-        admin_cursor.execute(
-            "INSERT INTO submissions (user_id, question_id, user_query, is_correct) VALUES (?, ?, ?, ?)",
-            (user_id, question_id, user_query, is_correct)
-        )
-        admin_conn.commit()
-        admin_conn.close()
+        # 5. Store the submission in the contest's admin database; returns once it is committed
+        with metrics.stage("store"):
+            stored, = admin.writer.write([(user_id, question_id, user_query, is_correct)])
+        if not stored:
+            # Lost a race with another request for the same (user, question) pair
+            return jsonify({"error": "You have already submitted an answer for this question."})
         
         return jsonify({"message": "Answer submitted!", "correct": is_correct})
     
+    except BudgetExceeded as e:
+        return jsonify({"error": str(e), "budget_exceeded": e.limit}), 422
     except Exception as e:
         return jsonify({"error": str(e)})
     
+@app.route('/submit_batch', methods=['POST'])
+def submit_batch():
+    data = request.json
+    submissions = data.get('submissions')
+
+    if not isinstance(submissions, list) or not all(isinstance(s, dict) for s in submissions):
+        return jsonify({"error": "submissions must be a list of {user_id, question_id, query} objects"}), 400
+    if len(submissions) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} submissions per batch"}), 400
+    contest = requested_contest(data)
+    if contest is None:
+        return unknown_contest()
+
+    try:
+        admin = contests.admin(contest.contest_id)
+
+        # 1. Look up every already-answered question of the users in this batch at once
+        with metrics.stage("duplicate_check"), admin.connection() as admin_conn:
+            answered = answered_questions(admin_conn.cursor(), {s.get('user_id') for s in submissions})
+
+        # 2. Grade each submission against the cached correct results
+        results = []
+        graded = []
+        for submission in submissions:
+            user_id = submission.get('user_id')
+            question_id = submission.get('question_id')
+            user_query = submission.get('query', '')
+
+            if not user_id:
+                results.append({"error": "User ID is required"})
+                continue
+            if (user_id, question_id) in answered:
+                results.append({"error": "You have already submitted an answer for this question."})
+                continue
+            try:
+                is_correct = graded_before(admin, question_id, user_query)
+                if is_correct is None:
+                    is_correct = grade(contest, admin, question_id, user_query)
+            except BudgetExceeded as e:
+                results.append({"error": str(e), "budget_exceeded": e.limit})
+                continue
+            except Exception as e:
+                results.append({"error": str(e)})
+                continue
+
+            answered.add((user_id, question_id))
+            graded.append((len(results), (user_id, question_id, user_query, is_correct)))
+            results.append({"correct": is_correct})
+
+        # 3. Store all graded submissions in one transaction (along with other requests' ones)
+        with metrics.stage("store"):
+            stored = admin.writer.write([row for _, row in graded]) if graded else []
+        for (index, _), ok in zip(graded, stored):
+            if not ok:
+                results[index] = {"error": "You have already submitted an answer for this question."}
+
+        return jsonify({"message": f"{sum(stored)} of {len(submissions)} answers submitted!", "results": results})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/submission/<int:submission_id>', methods=['GET'])
+def submission_status(submission_id):
+    contest = requested_contest(request.args)
+    if contest is None:
+        return unknown_contest()
+    if GRADING_WORKERS == 0:
+        return jsonify({"error": "Submissions are graded synchronously on this server"}), 404
+    try:
+        job = contests.admin(contest.contest_id).grading_queue.status(submission_id)
+        if job is None:
+            return jsonify({"error": "Unknown submission"}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/view_output', methods=['POST'])
+def view_output():
+    # One page of the query's result, {"columns": [...], "rows": [[...], ...], "next_cursor": ...},
+    # streamed while the rows are fetched. Send `cursor` (a previous page's next_cursor)
+    # for the following page and `limit` for the page size.
+    data = request.json
+    user_query = data.get('query', '')
+    contest = requested_contest(data)
+    if contest is None:
+        return unknown_contest()
+
+    try:
+        with metrics.stage("validate"):
+            validate_query(user_query)
+    except QueryRejected as e:
+        return jsonify({"error": str(e)})
+    try:
+        offset = decode_cursor(user_query, data.get('cursor'))
+        limit = page_size(data.get('limit'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Serve repeated pages from memory while the contest's dataset is unchanged
+    cache_key = (contest.contest_id, database_version(contest.dataset_path), normalize_sql(user_query),
+                 offset, limit)
+    cached = output_cache.get(cache_key)
+    if cached is not None:
+        return app.response_class(cached, mimetype="application/json")
+
+    try:
+        # Timed until the first rows are ready; the rest is fetched while it is sent
+        with contestant_query("view", contest, user_query):
+            body = started(columnar_json(
+                stream_page(contest, user_query, offset, limit),
+                next_cursor=lambda: encode_cursor(user_query, offset + limit),
+                on_complete=lambda page: output_cache.put(cache_key, page, len(page))))
+        return Response(body, mimetype="application/json")
+    except BudgetExceeded as e:
+        return jsonify({"error": str(e), "budget_exceeded": e.limit}), 422
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
 @app.route('/finish', methods=['POST'])
 def finalize_score():
     data = request.json
@@ -102,47 +461,52 @@ def finalize_score():
 
     if not user_id:
         return jsonify({"error": "User ID is required"}), 400
+    contest = requested_contest(data)
+    if contest is None:
+        return unknown_contest()
 
     try:
-        conn = get_admin_db_connection()
-        cursor = conn.cursor()
-
-        # Check if user already has a final score
-        cursor.execute("SELECT * FROM final_scores WHERE user_id = ?", (user_id,))
-        existing_record = cursor.fetchone()
-
-        if existing_record:
-            conn.close()
+        total_score = finalize(contests.admin(contest.contest_id), user_id)
+        if total_score is None:
             return jsonify({"error": "Score already finalized for this user"}), 400
 
-        # Calculate total score from submissions
-        cursor.execute("SELECT SUM(is_correct) as total_score FROM submissions WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
-        total_score = result["total_score"] if result["total_score"] is not None else 0
-
-        # Store the final score in the final_scores table
-        cursor.execute("INSERT INTO final_scores (user_id, score) VALUES (?, ?)", (user_id, total_score))
-        conn.commit()
-        conn.close()
-
-        return jsonify({"message": "Final score saved successfully!"})
+        return jsonify({"message": "Final score saved successfully!", "total_score": total_score})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
 @app.route('/winners', methods=['GET'])
 def winners():
+    # Top of the live scoreboard (highest score first, ties go to whoever got there first)
+    limit = min(request.args.get('limit', 2, type=int), MAX_WINNERS)
+    contest = requested_contest(request.args)
+    if contest is None:
+        return unknown_contest()
     try:
-        conn = get_admin_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id, score FROM final_scores ORDER BY score DESC LIMIT 2")
-        winner = cursor.fetchall()
-        conn.close()
-        return jsonify({"winners": [dict(row) for row in winner]})
+        return jsonify({"winners": top_scores(contests.admin(contest.contest_id), limit)})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/winners/stream', methods=['GET'])
+def winners_stream():
+    # Server-Sent Events: a snapshot of the top 10, then only the ranks that change
+    contest = requested_contest(request.args)
+    if contest is None:
+        return unknown_contest()
+    leaderboard = contests.admin(contest.contest_id).leaderboard
+    return Response(leaderboard.stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/contests', methods=['GET'])
+def contest_list():
+    # Registered contests, which datasets are loaded and their memory use
+    return jsonify(contests.stats())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # Stage timings, row counts and cache statistics of this server process
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other as top-level modules (run from v3/backend)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def contest_dir(tmp_path, monkeypatch):
+    """A working directory with a generated bookstore.db, where test3 opens its contest."""
+    from benchmark import generate_bookstore
+    generate_bookstore(str(tmp_path / "bookstore.db"), 1)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
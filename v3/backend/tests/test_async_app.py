@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("quart")
+pytest.importorskip("hypercorn")
+
+import async_app  # noqa: E402
+
+
+def test_submit_query(contest_dir):
+    async def submit(app, body):
+        response = await app.test_client().post("/submit_query", json=body)
+        return response.status_code, await response.get_json()
+
+    async def session():
+        # test_app() runs the before/after_serving hooks: warm-up, then the final writes
+        async with async_app.app.test_app() as app:
+            first = await submit(app, {"user_id": "ann", "question_id": 2, "query": "SELECT COUNT(*) FROM customers"})
+            again = await submit(app, {"user_id": "ann", "question_id": 2, "query": "SELECT 1"})
+            return first, again
+
+    first, again = asyncio.run(session())
+    assert first == (200, {"message": "Answer submitted!", "correct": 1})
+    assert again == (200, {"error": "You have already submitted an answer for this question."})
@@ -0,0 +1,61 @@
+import sqlite3
+
+import pytest
+
+from budget import BudgetExceeded, ExecutionBudget
+from grader import Grader
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = str(tmp_path / "numbers.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE numbers (n INTEGER)")
+    conn.executemany("INSERT INTO numbers VALUES (?)", [(n,) for n in range(50)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_row_limit():
+    conn = sqlite3.connect(":memory:")
+    with pytest.raises(BudgetExceeded) as info:
+        with ExecutionBudget(max_rows=3).run(conn) as tracker:
+            list(tracker.track(conn.execute("VALUES (1), (2), (3), (4)")))
+    assert info.value.limit == "rows"
+
+
+def test_vm_step_limit():
+    conn = sqlite3.connect(":memory:")
+    endless = "WITH RECURSIVE r(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM r) SELECT COUNT(*) FROM r"
+    with pytest.raises(BudgetExceeded) as info:
+        with ExecutionBudget(max_vm_steps=100_000, max_plan_cost=None).run(conn):
+            conn.execute(endless).fetchall()
+    assert info.value.limit == "vm_steps"
+
+
+def test_answer_with_more_rows_than_max_rows_is_graded(dataset):
+    grader = Grader(dataset, {1: "SELECT n FROM numbers;"}, ExecutionBudget(max_rows=10))
+    try:
+        assert grader.grade(1, "SELECT n FROM numbers") == 1
+        assert grader.grade(1, "SELECT n FROM numbers UNION ALL SELECT 1") == 0
+    finally:
+        grader.close()
+
+
+def test_answer_bigger_than_max_bytes_is_graded(dataset):
+    grader = Grader(dataset, {1: "SELECT n FROM numbers;"}, ExecutionBudget(max_rows=10, max_bytes=100))
+    try:
+        assert grader.grade(1, "SELECT n FROM numbers") == 1
+    finally:
+        grader.close()
+
+
+def test_byte_limit_applies_past_the_size_of_the_reference(dataset):
+    grader = Grader(dataset, {1: "SELECT n FROM numbers;"}, ExecutionBudget(max_bytes=100))
+    try:
+        with pytest.raises(BudgetExceeded) as info:
+            grader.grade(1, "SELECT n FROM numbers UNION ALL SELECT printf('%.*c', 100000, 'x')")
+        assert info.value.limit == "bytes"
+    finally:
+        grader.close()
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+from comparator import build_fingerprint, build_reference, cursor_matches, fingerprint_matches
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE books (id INTEGER PRIMARY KEY, title TEXT, price REAL);
+        INSERT INTO books (title, price) VALUES ('Dune', 9.99), ('Emma', 4.5), ('Dune', 9.99), ('Ulysses', 20.1);
+    """)
+    return conn
+
+
+def grade(conn, reference_query, user_query):
+    """Verdicts of the reference comparison and of the fingerprint comparison."""
+    reference = build_reference(conn.cursor(), reference_query)
+    fingerprint = build_fingerprint(conn.cursor(), reference_query)
+    return (cursor_matches(reference, conn.execute(user_query)),
+            fingerprint_matches(fingerprint, conn.execute(user_query)))
+
+
+@pytest.mark.parametrize("user_query, matches", [
+    ("SELECT title, price FROM books", True),
+    ("SELECT title, price FROM books ORDER BY random()", True),
+    ("SELECT price, title FROM books", True),                       # columns matched by name
+    ("SELECT title, price * 3 / 3 AS price FROM books", True),      # float noise is rounded away
+    ("SELECT DISTINCT title, price FROM books", False),             # duplicates count
+    ("SELECT title, price FROM books UNION ALL SELECT 'Emma', 4.5", False),
+    ("SELECT title, price FROM books WHERE id > 1", False),
+    ("SELECT title FROM books", False),
+    ("SELECT title AS name, price FROM books", False),
+])
+def test_unordered_reference(conn, user_query, matches):
+    assert grade(conn, "SELECT title, price FROM books", user_query) == (matches, matches)
+
+
+@pytest.mark.parametrize("user_query, matches", [
+    ("SELECT title FROM books ORDER BY price DESC, id", True),
+    ("SELECT title FROM books ORDER BY price, id", False),
+])
+def test_ordered_reference(conn, user_query, matches):
+    assert grade(conn, "SELECT title FROM books ORDER BY price DESC, id", user_query) == (matches, matches)
+
+
+def test_empty_results_match(conn):
+    assert grade(conn, "SELECT title FROM books WHERE 0", "SELECT title FROM books WHERE price < 0") == (True, True)
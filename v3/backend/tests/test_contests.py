@@ -0,0 +1,76 @@
+import threading
+import time
+
+from contests import Contest, ContestRegistry
+from reference_cache import ReferenceCache
+
+
+class FakeDataset:
+    def __init__(self, size):
+        self.size = size
+        self.closed = False
+
+    def memory_bytes(self):
+        return self.size
+
+    def close(self):
+        self.closed = True
+
+
+def registry(opened, memory_limit):
+    def open_dataset(contest):
+        opened[contest.contest_id] = FakeDataset(60)
+        return opened[contest.contest_id]
+    contests = ContestRegistry(open_dataset, None, memory_limit=memory_limit)
+    for contest_id in "ab":
+        contests.register(Contest(contest_id, f"{contest_id}.db", {}, f"{contest_id}_contest.db"))
+    return contests
+
+
+def test_evicted_dataset_is_closed_when_its_last_request_ends():
+    opened = {}
+    contests = registry(opened, memory_limit=100)
+    with contests.dataset("a") as a:
+        with contests.dataset("b"):
+            pass
+        assert contests.stats()["loaded"] == ["b"]
+        assert not a.closed
+    assert a.closed
+
+
+def test_unused_dataset_is_closed_on_eviction():
+    opened = {}
+    contests = registry(opened, memory_limit=100)
+    with contests.dataset("a"):
+        pass
+    with contests.dataset("b"):
+        assert opened["a"].closed
+    assert not opened["b"].closed
+
+
+def test_slow_reference_query_does_not_block_other_questions(tmp_path):
+    path = tmp_path / "dataset.db"
+    path.write_bytes(b"data")
+    started = threading.Event()
+    release = threading.Event()
+
+    class Result:
+        size_bytes = 10
+
+    def run_query(query):
+        if query == "slow":
+            started.set()
+            release.wait(5)
+        return Result()
+
+    cache = ReferenceCache(str(path), {1: "slow", 2: "fast"}, run_query)
+    slow = threading.Thread(target=cache.get, args=(1,))
+    slow.start()
+    assert started.wait(5)
+    begin = time.perf_counter()
+    assert cache.get(2) is not None
+    assert cache.memory_bytes() == 10
+    assert time.perf_counter() - begin < 1
+    release.set()
+    slow.join()
+    assert cache.memory_bytes() == 20
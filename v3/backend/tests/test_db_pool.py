@@ -0,0 +1,66 @@
+import os
+import sqlite3
+
+import pytest
+
+from db_pool import ConnectionPool
+
+
+@pytest.mark.parametrize("journal_mode", ["delete", "wal"])
+def test_in_memory_copy_of_dataset(tmp_path, journal_mode):
+    path = str(tmp_path / "dataset.db")
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    conn.execute("CREATE TABLE books (title TEXT)")
+    conn.execute("INSERT INTO books VALUES ('Dune')")
+    conn.commit()
+    conn.close()
+
+    pool = ConnectionPool(path, read_only=True, in_memory=True)
+    with pool.connection() as copy:
+        assert copy.execute("SELECT title FROM books").fetchall()[0][0] == "Dune"
+    assert pool.memory_bytes() > 0  # it was a copy, not the file
+    pool.close_all()
+
+
+def test_memory_bytes_counts_each_open_copy_at_its_size(tmp_path):
+    path = str(tmp_path / "dataset.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE books (title TEXT)")
+    conn.commit()
+
+    pool = ConnectionPool(path, read_only=True, in_memory=True)
+    old = pool.acquire()
+    old_size = os.path.getsize(path)
+    assert pool.memory_bytes() == 2 * old_size  # the image and one copy of it
+
+    conn.executemany("INSERT INTO books VALUES (?)", [("x" * 1000,)] * 100)
+    conn.commit()
+    conn.close()
+    new = pool.acquire()
+    new_size = os.path.getsize(path)
+    assert pool.memory_bytes() == 2 * new_size + old_size
+    pool.release(new)
+    pool.release(old)
+    pool.acquire()  # closes the copy of the old file instead of handing it out
+    assert pool.memory_bytes() == 2 * new_size
+
+
+def test_copies_stay_within_memory_limit(tmp_path):
+    path = str(tmp_path / "dataset.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE books (title TEXT)")
+    conn.commit()
+    conn.close()
+    size = os.path.getsize(path)
+
+    pool = ConnectionPool(path, read_only=True, in_memory=True, memory_limit=3 * size)
+    first, second, third = pool.acquire(), pool.acquire(), pool.acquire()
+    # Two copies fit next to the image; the third connection reads the file
+    files = [conn.execute("PRAGMA database_list").fetchone()["file"] for conn in (first, second, third)]
+    assert [file.endswith("dataset.db") for file in files] == [False, False, True]
+    assert pool.memory_bytes() == 3 * size
+    for conn in (first, second, third):
+        pool.release(conn)
+    pool.close_all()
+    assert pool.memory_bytes() == size
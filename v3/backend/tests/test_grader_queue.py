@@ -0,0 +1,73 @@
+import sqlite3
+import time
+
+import pytest
+
+from budget import ExecutionBudget
+from db_pool import ConnectionPool
+from grader import Grader
+from grader_queue import ALREADY_SUBMITTED, STALE_JOB_SECONDS, GradingQueue
+from migrations import CONTEST_MIGRATIONS, run_migrations
+from scoreboard import store_submissions
+
+ANSWERS = {1: "SELECT COUNT(*) FROM customers;"}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    dataset = str(tmp_path / "bookstore.db")
+    conn = sqlite3.connect(dataset)
+    conn.executescript("CREATE TABLE customers (name TEXT); INSERT INTO customers VALUES ('Ann'), ('Bob');")
+    conn.close()
+    pool = ConnectionPool(str(tmp_path / "contest.db"), wal=True)
+    with pool.connection() as conn:
+        run_migrations(conn, "contest", CONTEST_MIGRATIONS)
+
+    def store_result(cursor, job, is_correct):
+        stored, = store_submissions(cursor, [(job["user_id"], job["question_id"], job["user_query"], is_correct)])
+        return stored
+
+    queue = GradingQueue(pool.connection, Grader(dataset, ANSWERS, ExecutionBudget()), 1,
+                         store_result=store_result, poll_interval=0.05)
+    yield queue, pool
+    queue.shutdown()
+    pool.close_all()
+
+
+def add_job(pool, user_id, status="queued", claimed_at=None):
+    with pool.connection() as conn:
+        cursor = conn.execute(
+            "INSERT INTO grading_jobs (user_id, question_id, user_query, status, created_at, claimed_at) "
+            "VALUES (?, 1, 'SELECT COUNT(*) FROM customers', ?, ?, ?)", (user_id, status, time.time(), claimed_at))
+        conn.commit()
+    return cursor.lastrowid
+
+
+def wait_finished(queue, job_id):
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        job = queue.status(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_jobs_left_by_an_earlier_run_are_graded_on_start(queue):
+    queue, pool = queue
+    queued = add_job(pool, "ann")
+    abandoned = add_job(pool, "bob", status="running", claimed_at=time.time() - STALE_JOB_SECONDS - 1)
+    queue.start()
+    assert wait_finished(queue, queued)["is_correct"] == 1
+    assert wait_finished(queue, abandoned)["is_correct"] == 1
+
+
+def test_job_of_an_already_answered_question_is_not_reported_as_graded(queue):
+    queue, pool = queue
+    with pool.connection() as conn:
+        store_submissions(conn.cursor(), [("ann", 1, "SELECT 0", 0)])
+        conn.commit()
+    job = wait_finished(queue, queue.enqueue("ann", 1, "SELECT COUNT(*) FROM customers"))
+    assert (job["status"], job["is_correct"], job["error"]) == ("error", None, ALREADY_SUBMITTED)
+    with pool.connection() as conn:
+        assert [tuple(row) for row in conn.execute("SELECT user_query, is_correct FROM submissions")] == [("SELECT 0", 0)]
@@ -0,0 +1,41 @@
+import sqlite3
+
+import pytest
+
+from db_pool import ConnectionPool
+from group_commit import GroupCommitWriter
+from migrations import CONTEST_MIGRATIONS, run_migrations
+from scoreboard import store_submission_groups
+
+
+@pytest.fixture
+def writer(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "contest.db"), wal=True)
+    with pool.connection() as conn:
+        run_migrations(conn, "contest", CONTEST_MIGRATIONS)
+    writer = GroupCommitWriter(pool.connection, store_submission_groups, max_batch=2)
+    yield writer, pool
+    writer.shutdown()
+    pool.close_all()
+
+
+def submission_count(pool):
+    with pool.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM submissions").fetchone()[0]
+
+
+def test_each_record_gets_its_rows_results(writer):
+    writer, pool = writer
+    first = writer.submit([("ann", 1, "SELECT 1", 1), ("ann", 2, "SELECT 2", 0)])
+    second = writer.submit([("ann", 1, "SELECT 3", 1)])
+    assert first.result() == [True, True]
+    assert second.result() == [False]
+    assert submission_count(pool) == 2
+
+
+def test_a_group_larger_than_max_batch_is_one_transaction(writer):
+    writer, pool = writer
+    rows = [(f"user{n}", 1, "SELECT 1", 1) for n in range(5)] + [(None, 1, "SELECT 1", 1)]
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.write(rows)
+    assert submission_count(pool) == 0
@@ -0,0 +1,18 @@
+import sqlite3
+
+from migrations import CONTEST_MIGRATIONS, run_migrations
+
+
+def test_duplicate_submissions_are_kept_aside():
+    conn = sqlite3.connect(":memory:")
+    # A submissions table from before one submission per question was enforced
+    conn.execute("""CREATE TABLE submissions (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL,
+                    question_id INTEGER NOT NULL, user_query TEXT NOT NULL, is_correct INTEGER NOT NULL DEFAULT 0)""")
+    conn.executemany("INSERT INTO submissions (user_id, question_id, user_query, is_correct) VALUES (?, ?, ?, ?)", [
+        ("ann", 1, "SELECT 1", 0), ("ann", 1, "SELECT 2", 1), ("ann", 2, "SELECT 3", 1)])
+    conn.commit()
+
+    run_migrations(conn, "contest", CONTEST_MIGRATIONS)
+    assert conn.execute("SELECT user_query FROM submissions ORDER BY id").fetchall() == [("SELECT 1",), ("SELECT 3",)]
+    assert conn.execute("SELECT id, user_query, is_correct FROM submissions_duplicates").fetchall() == [(2, "SELECT 2", 1)]
+    assert run_migrations(conn, "contest", CONTEST_MIGRATIONS) == []
@@ -0,0 +1,34 @@
+import sqlite3
+
+import pytest
+
+from budget import BudgetExceeded
+from query_plan import PlanAnalyzer
+
+MAX_COST = 100_000_000
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = str(tmp_path / "bookstore.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE books (id INTEGER PRIMARY KEY, title TEXT, price REAL, stock INTEGER);
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 20000)
+        INSERT INTO books SELECT i, 'Book ' || i, i % 60, i % 200 FROM n;
+    """)
+    yield PlanAnalyzer(path), conn
+    conn.close()
+
+
+def test_correlated_exists_is_costed_as_a_lookup(dataset):
+    analyzer, conn = dataset
+    sql = "SELECT title FROM books b WHERE NOT EXISTS (SELECT 1 FROM books b2 WHERE b2.price > b.price)"
+    assert analyzer.check(conn, sql, MAX_COST).cost < 1_000_000
+
+
+def test_correlated_scalar_subquery_is_costed_per_outer_row(dataset):
+    analyzer, conn = dataset
+    sql = "SELECT title FROM books b WHERE price > (SELECT AVG(price) FROM books b2 WHERE b2.stock = b.stock)"
+    with pytest.raises(BudgetExceeded):
+        analyzer.check(conn, sql, MAX_COST)
@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+from migrations import CONTEST_MIGRATIONS, run_migrations
+from scoreboard import Scoreboard, store_submissions
+
+
+class SnapshotConnection:
+    """Answers the sync query with rows read earlier, like a sync that read before another one."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=()):
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+
+def admin_db():
+    conn = sqlite3.connect(":memory:")
+    run_migrations(conn, "contest", CONTEST_MIGRATIONS)
+    return conn
+
+
+def submit(conn, *rows):
+    stored = store_submissions(conn.cursor(), list(rows))
+    conn.commit()
+    return stored
+
+
+def test_sync_ranks_by_score_then_time():
+    conn = admin_db()
+    submit(conn, ("ann", 1, "SELECT 1", 1), ("bob", 1, "SELECT 1", 1), ("bob", 2, "SELECT 2", 1))
+    board = Scoreboard()
+    assert board.sync(conn)
+    assert [entry["user_id"] for entry in board.top(2)] == ["bob", "ann"]
+    assert not board.sync(conn)
+
+
+def test_stale_rows_of_an_overlapping_sync_are_not_applied():
+    conn = admin_db()
+    submit(conn, ("ann", 1, "SELECT 1", 1))
+    stale = conn.execute("SELECT user_id, score, reached_at, finished, version FROM scoreboard").fetchall()
+    submit(conn, ("ann", 2, "SELECT 2", 1))
+
+    board = Scoreboard()
+    board.sync(conn)                       # the newer read is applied first...
+    board.sync(SnapshotConnection(stale))  # ...then the older one
+    assert board.top(1)[0]["score"] == 2
+    assert board.sync(conn) is False
+    assert board.top(1)[0]["score"] == 2
+
+
+def test_duplicate_submission_is_not_stored():
+    conn = admin_db()
+    assert submit(conn, ("ann", 1, "SELECT 1", 1)) == [True]
+    assert submit(conn, ("ann", 1, "SELECT 2", 0)) == [False]
+
+
+def test_missing_user_id_is_an_error_not_a_duplicate():
+    conn = admin_db()
+    with pytest.raises(sqlite3.IntegrityError):
+        submit(conn, (None, 1, "SELECT 1", 1))
@@ -0,0 +1,43 @@
+import signal
+import threading
+
+import pytest
+
+pytest.importorskip("gunicorn")
+
+import serve  # noqa: E402
+import test3  # noqa: E402
+
+
+class FakeWorker:
+    def __init__(self):
+        self.exits = []
+
+    def handle_exit(self, sig, frame):
+        self.exits.append(sig)
+
+
+def test_sigterm_ends_leaderboard_streams_and_drains(contest_dir):
+    worker = FakeWorker()
+    previous = signal.getsignal(signal.SIGTERM)
+    try:
+        serve.post_worker_init(worker)
+        assert test3.contests.stats()["loaded"] == [test3.DEFAULT_CONTEST]
+
+        stream = test3.contests.admin(test3.DEFAULT_CONTEST).leaderboard.stream()
+        assert next(stream).startswith("event: snapshot")
+        rest = []
+        reader = threading.Thread(target=lambda: rest.extend(stream))
+        reader.start()
+
+        signal.getsignal(signal.SIGTERM)(signal.SIGTERM, None)
+        reader.join(5)
+        assert not reader.is_alive()  # the stream ended instead of holding up the drain
+        assert worker.exits == [signal.SIGTERM]  # then gunicorn's own graceful exit
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        test3.shutdown()
+
+
+def test_create_app_is_the_flask_app():
+    assert serve.create_app() is test3.app
@@ -0,0 +1,31 @@
+import sqlite3
+
+import pytest
+
+from sql_text import normalize_sql
+
+
+def column_name(sql):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE books (price REAL, genre TEXT)")
+    return conn.execute(sql).description[0][0]
+
+
+def test_spacing_and_keyword_case_outside_the_select_list_are_folded():
+    assert normalize_sql("select  price\nfrom books   where price > 2 ;") == \
+        normalize_sql("SELECT price FROM books WHERE price > 2")
+
+
+@pytest.mark.parametrize("first, second", [
+    ("SELECT price*2 FROM books", "SELECT price * 2 FROM books"),
+    ("SELECT COUNT( * ) FROM books", "SELECT COUNT(*) FROM books;"),
+    ("SELECT COUNT(distinct genre) FROM books", "SELECT COUNT(DISTINCT genre) FROM books"),
+    ("SELECT * FROM (SELECT price*2 FROM books)", "SELECT * FROM (SELECT price * 2 FROM books)"),
+])
+def test_select_lists_that_name_columns_differently_stay_apart(first, second):
+    assert column_name(first) != column_name(second)
+    assert normalize_sql(first) != normalize_sql(second)
+
+
+def test_comment_after_the_select_list_is_not_kept():
+    assert normalize_sql("SELECT price -- the price\nFROM books") == normalize_sql("SELECT price FROM books")
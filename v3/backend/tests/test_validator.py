@@ -0,0 +1,41 @@
+import sqlite3
+
+import pytest
+
+from validator import QueryRejected, authorizer_errors, read_only_authorizer, validate_query
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM books;",
+    "with cheap as (select * from books where price < 5) select title from cheap",
+    "VALUES (1)",
+    "SELECT replace(title, 'a', 'b') FROM books",
+    "SELECT 'DROP TABLE books' FROM books",
+])
+def test_read_queries_pass(sql):
+    validate_query(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "",
+    "DELETE FROM books",
+    "SELECT 1; DROP TABLE books",
+    "WITH x AS (SELECT 1) DELETE FROM books",
+    "ATTACH 'other.db' AS other",
+    "REPLACE INTO books VALUES (1)",
+])
+def test_other_statements_are_rejected(sql):
+    with pytest.raises(QueryRejected):
+        validate_query(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM pragma_table_info('books')",
+    "SELECT load_extension('evil.so')",
+])
+def test_authorizer_refuses_what_the_token_check_lets_through(sql):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE books (title TEXT)")
+    conn.set_authorizer(read_only_authorizer)
+    with pytest.raises(QueryRejected), authorizer_errors():
+        conn.execute(sql)
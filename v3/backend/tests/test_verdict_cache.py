@@ -0,0 +1,48 @@
+import sqlite3
+
+from budget import ExecutionBudget
+from db_pool import ConnectionPool
+from grader import Grader
+from verdict_cache import GRADE_VERDICTS_TABLE, VerdictCache
+
+ANSWERS = {1: "SELECT COUNT(*) FROM customers;", 2: "SELECT COUNT(DISTINCT genre) FROM books;"}
+
+
+def make_dataset(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE customers (customer_id INTEGER PRIMARY KEY, name TEXT);
+        INSERT INTO customers (name) VALUES ('Ann'), ('Bob');
+        CREATE TABLE books (book_id INTEGER PRIMARY KEY, genre TEXT);
+        INSERT INTO books (genre) VALUES ('Fantasy'), ('Crime'), ('Fantasy');
+    """)
+    conn.close()
+
+
+def grade_with_cache(grader, verdicts, question_id, query):
+    is_correct = verdicts.get(question_id, query)
+    if is_correct is None:
+        is_correct = grader.grade(question_id, query)
+        verdicts.put(question_id, query, is_correct)
+    return is_correct
+
+
+def test_verdict_of_a_differently_spelled_select_list_is_not_reused(tmp_path):
+    dataset = str(tmp_path / "bookstore.db")
+    make_dataset(dataset)
+    admin = ConnectionPool(str(tmp_path / "contest.db"))
+    with admin.connection() as conn:
+        conn.execute(GRADE_VERDICTS_TABLE)
+    grader = Grader(dataset, ANSWERS, ExecutionBudget())
+    verdicts = VerdictCache(admin.connection, dataset, ANSWERS)
+    try:
+        # The column of `COUNT( * )` is named "COUNT( * )", so it doesn't match the reference
+        assert grade_with_cache(grader, verdicts, 1, "SELECT COUNT( * ) FROM customers") == 0
+        assert grade_with_cache(grader, verdicts, 1, "SELECT COUNT(*) FROM customers;") == 1
+        assert grade_with_cache(grader, verdicts, 2, "SELECT COUNT(distinct genre) FROM books") == 0
+        assert grade_with_cache(grader, verdicts, 2, "SELECT COUNT(DISTINCT genre) FROM books") == 1
+        # Only spacing outside the select list: the verdict is reused
+        assert verdicts.get(1, "SELECT COUNT(*)\n  from customers") == 1
+    finally:
+        verdicts.shutdown()
+        grader.close()
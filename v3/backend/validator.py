@@ -0,0 +1,79 @@
+import sqlite3
+from contextlib import contextmanager
+from functools import lru_cache
+
+from sql_text import tokenize
+
+# Statements a contestant query may start with
+READ_STATEMENTS = {"SELECT", "WITH", "VALUES"}
+
+# Keywords that only appear in statements which change or escape the database.
+# REPLACE is not listed because it is also a string function; a REPLACE
+# statement is caught by READ_STATEMENTS and by the authorizer.
+FORBIDDEN_KEYWORDS = {
+    "INSERT", "UPDATE", "DELETE", "DROP", "CREATE", "ALTER", "ATTACH",
+    "DETACH", "PRAGMA", "VACUUM", "REINDEX", "ANALYZE",
+}
+
+# Authorizer actions a read-only query needs
+ALLOWED_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    getattr(sqlite3, "SQLITE_RECURSIVE", 33),
+}
+
+
+class QueryRejected(Exception):
+    """The query is not a single read-only statement."""
+
+
+@lru_cache(maxsize=4096)
+def precheck(sql):
+    """Token-level check of a query; returns the reason it is rejected, or None.
+
+    Memoized on the exact query text, so a resubmitted query costs one lookup.
+    """
+    tokens = tokenize(sql)
+    while tokens and tokens[-1] == ("op", ";"):
+        tokens.pop()
+    if not tokens:
+        return "Query is empty"
+    if ("op", ";") in tokens:
+        return "Only one statement can be run at a time"
+    if tokens[0][0] != "word" or tokens[0][1].upper() not in READ_STATEMENTS:
+        return "Only SELECT queries are allowed"
+    for kind, text in tokens:
+        if kind == "word" and text.upper() in FORBIDDEN_KEYWORDS:
+            return "Modifications are not allowed!"
+    return None
+
+
+def validate_query(sql):
+    """Raise QueryRejected unless `sql` passes the token pre-check."""
+    reason = precheck(sql)
+    if reason is not None:
+        raise QueryRejected(reason)
+
+
+def read_only_authorizer(action, arg1, arg2, db_name, source):
+    if action in ALLOWED_ACTIONS:
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+@contextmanager
+def authorizer_errors():
+    """Turn the read-only authorizer's refusals into QueryRejected.
+
+    For connections that keep read_only_authorizer installed (see
+    ConnectionPool's `authorizer`); installing it per query would throw
+    away the connection's prepared statements, as every set_authorizer()
+    call does.
+    """
+    try:
+        yield
+    except sqlite3.DatabaseError as e:
+        if "not authorized" in str(e):
+            raise QueryRejected("Only read-only queries are allowed") from None
+        raise
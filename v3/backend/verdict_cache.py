@@ -0,0 +1,122 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from group_commit import GroupCommitWriter
+from reference_cache import file_digest, file_fingerprint
+from sql_text import normalize_sql
+
+GRADE_VERDICTS_TABLE = '''
+CREATE TABLE IF NOT EXISTS grade_verdicts (
+    dataset_version TEXT NOT NULL,  -- content hash of the dataset file
+    question_id INTEGER NOT NULL,
+    query_hash TEXT NOT NULL,       -- see VerdictCache.query_hash
+    is_correct INTEGER NOT NULL,
+    graded_at REAL NOT NULL,
+    PRIMARY KEY (dataset_version, question_id, query_hash)
+) WITHOUT ROWID
+'''
+
+# Verdicts also kept in memory, in front of the table
+MEMORY_ENTRIES = 100_000
+
+
+class VerdictCache:
+    """Correctness of queries already graded, by (dataset version, question, query text).
+
+    Grading is deterministic for a given dataset file and correct query, so
+    a resubmitted query (same text after normalize_sql, which keeps the
+    select list as typed since it names the result columns) gets its
+    earlier result without running. Verdicts live in the admin database's
+    `grade_verdicts` table, so they survive restarts, with the most recent
+    ones in memory. New verdicts are written in the background. The
+    dataset version is its content hash, taken again whenever the file's
+    mtime/size changes.
+    """
+
+    def __init__(self, connection, dataset_path, answers, memory_entries=MEMORY_ENTRIES):
+        self.connection = connection  # () -> context manager yielding an admin connection
+        self.dataset_path = dataset_path
+        self.answers = answers
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # (version, question_id, query_hash) -> is_correct
+        self._stamp = None
+        self._version = None
+        self._lock = threading.Lock()
+        self._writer = GroupCommitWriter(connection, self._save)
+
+    def _dataset_version(self):
+        stamp = file_fingerprint(self.dataset_path)
+        if stamp != self._stamp:
+            self._version = file_digest(self.dataset_path)
+            self._stamp = stamp
+        return self._version
+
+    def query_hash(self, question_id, user_query):
+        # The correct query is part of the key, so editing a question retires its verdicts
+        correct = normalize_sql(self.answers.get(question_id, ""))
+        return hashlib.sha256(f"{correct}\0{normalize_sql(user_query)}".encode()).hexdigest()
+
+    def _key(self, question_id, user_query):
+        with self._lock:
+            version = self._dataset_version()
+        return version, question_id, self.query_hash(question_id, user_query)
+
+    def get(self, question_id, user_query):
+        """The stored verdict (1 or 0) for this query, or None if it hasn't been graded."""
+        key = self._key(question_id, user_query)
+        with self._lock:
+            is_correct = self._memory.get(key)
+            if is_correct is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return is_correct
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT is_correct FROM grade_verdicts WHERE dataset_version = ? AND question_id = ? AND query_hash = ?",
+                key).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, question_id, user_query, is_correct):
+        """Record a verdict; it is in memory at once and in the table shortly after."""
+        key = self._key(question_id, user_query)
+        with self._lock:
+            self._remember(key, is_correct)
+        self._writer.submit(key + (is_correct,))
+
+    def _remember(self, key, is_correct):
+        self._memory[key] = is_correct
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _save(self, cursor, rows):
+        now = time.time()
+        cursor.executemany(
+            "INSERT OR IGNORE INTO grade_verdicts (dataset_version, question_id, query_hash, is_correct, graded_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [row + (now,) for row in rows])
+        return [None] * len(rows)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def shutdown(self):
+        """Write the verdicts still queued."""
+        self._writer.shutdown()